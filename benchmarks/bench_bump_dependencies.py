@@ -0,0 +1,187 @@
+# Copyright (c) 2025-2026 Corey Goldberg
+# SPDX-License-Identifier: MIT
+
+
+"""Benchmarks for bump_dependencies.
+
+Runs `Updater.update` against a local fake PyPI server for generated pyproject.toml files of increasing size,
+reporting wall time, peak memory, requests issued and bytes transferred. Also measures startup time of the module
+and the CLI.
+
+Run with: python benchmarks/bench_bump_dependencies.py [--deps 10,100,1000] [--latency 0.05] ...
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import tomlkit
+from fake_pypi import FakePyPI
+
+import bump_dependencies as bd
+
+
+def generate_pyproject(num_dependencies, requires_python=">=3.10"):
+    """Generate a pyproject.toml with dependencies spread across all three kinds of dependency groups."""
+    operators = ("==", ">=", "~=", ">")
+    specifiers = [f"pkg-{i:04d}{operators[i % len(operators)]}0.1.0" for i in range(num_dependencies)]
+    groups = [specifiers[i::5] for i in range(5)]
+    document = tomlkit.document()
+    document["project"] = {
+        "name": "bench",
+        "version": "1.0",
+        "requires-python": requires_python,
+        "dependencies": groups[0],
+        "optional-dependencies": {"extra-a": groups[1], "extra-b": groups[2]},
+    }
+    document["dependency-groups"] = {"group-a": groups[3], "group-b": groups[4]}
+    return tomlkit.loads(tomlkit.dumps(document))
+
+
+def bench_update(fake_pypi, num_dependencies, jobs, trace_memory):
+    """Time one update, then measure its peak memory in a second traced run so tracing doesn't skew the timing."""
+
+    def update():
+        updater = bd.Updater(jobs=jobs, index=bd.SimpleIndex(f"{fake_pypi.url}/simple"))
+        updater.pyproject_data = generate_pyproject(num_dependencies)
+        fake_pypi.reset_stats()
+        start = time.perf_counter()
+        updater.update(dry_run=True)
+        return time.perf_counter() - start
+
+    elapsed = update()
+    num_requests, bytes_sent = fake_pypi.requests, fake_pypi.bytes_sent
+    peak_memory = None
+    if trace_memory:
+        tracemalloc.start()
+        update()
+        _, peak_memory = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return elapsed, peak_memory, num_requests, bytes_sent
+
+
+def bench_cached(fake_pypi, num_dependencies, jobs, trace_memory):
+    """Time an update with a warm HTTP cache, where releases are loaded from compact release indexes."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+
+        def update():
+            updater = bd.Updater(
+                jobs=jobs,
+                index=bd.SimpleIndex(f"{fake_pypi.url}/simple"),
+                http_cache=bd.HTTPCache(tmp_dir, ttl=3600),
+            )
+            updater.pyproject_data = generate_pyproject(num_dependencies)
+            start = time.perf_counter()
+            updater.update(dry_run=True)
+            return time.perf_counter() - start
+
+        update()
+        elapsed = update()
+        peak_memory = None
+        if trace_memory:
+            tracemalloc.start()
+            update()
+            _, peak_memory = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+    return elapsed, peak_memory
+
+
+def bench_incremental(fake_pypi, num_dependencies, jobs, changed_fraction=0.01):
+    """Time an update with a state file after `changed_fraction` of the packages were published since the last run."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        state_path = os.path.join(tmp_dir, "state.json")
+
+        def update():
+            updater = bd.Updater(
+                jobs=jobs,
+                index=bd.SimpleIndex(f"{fake_pypi.url}/simple"),
+                state=bd.StateFile(state_path),
+            )
+            updater.pyproject_data = generate_pyproject(num_dependencies)
+            fake_pypi.reset_stats()
+            start = time.perf_counter()
+            updater.update(dry_run=True)
+            return time.perf_counter() - start
+
+        update()
+        for i in range(max(1, int(num_dependencies * changed_fraction))):
+            fake_pypi.publish(f"pkg-{i:04d}")
+        elapsed = update()
+    return elapsed, fake_pypi.requests, fake_pypi.bytes_sent
+
+
+def bench_startup(repeat):
+    commands = {
+        "import bump_dependencies": [sys.executable, "-c", "import bump_dependencies"],
+        "bump_dependencies --help": [sys.executable, "-c", "import bump_dependencies; bump_dependencies.main()", "-h"],
+    }
+    results = {}
+    for name, command in commands.items():
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            subprocess.run(command, check=True, capture_output=True)  # noqa: S603
+            timings.append(time.perf_counter() - start)
+        results[name] = statistics.median(timings)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--deps", default="10,100,1000", help="comma separated dependency counts")
+    parser.add_argument("--jobs", type=int, default=bd.DEFAULT_JOBS, help="number of concurrent lookups")
+    parser.add_argument("--latency", type=float, default=0.02, help="fake server latency per request (seconds)")
+    parser.add_argument("--releases", type=int, default=50, help="releases per package")
+    parser.add_argument("--files", type=int, default=3, help="files per release")
+    parser.add_argument("--payload-size", type=int, default=64, help="padding bytes per file entry")
+    parser.add_argument("--repeat", type=int, default=5, help="startup timing repetitions")
+    parser.add_argument("--no-memory", action="store_false", dest="trace_memory", help="don't measure peak memory")
+    args = parser.parse_args()
+
+    bd.logger.disabled = True
+    print("startup (median):")
+    for name, elapsed in bench_startup(args.repeat).items():
+        print(f"  {name:<28} {elapsed * 1000:8.1f} ms")
+
+    print(
+        f"\nUpdater.update (jobs={args.jobs}, latency={args.latency}s, releases={args.releases}, "
+        f"files={args.files}, payload={args.payload_size}B):"
+    )
+    print(f"  {'deps':>6} {'wall':>10} {'peak mem':>10} {'requests':>9} {'bytes':>12}")
+    with FakePyPI(
+        latency=args.latency,
+        releases=args.releases,
+        files=args.files,
+        payload_size=args.payload_size,
+    ) as fake_pypi:
+        for num_dependencies in map(int, args.deps.split(",")):
+            elapsed, peak_memory, num_requests, bytes_sent = bench_update(
+                fake_pypi,
+                num_dependencies,
+                args.jobs,
+                args.trace_memory,
+            )
+            memory = f"{peak_memory / 1024 / 1024:8.1f}MB" if peak_memory is not None else f"{'-':>10}"
+            print(f"  {num_dependencies:>6} {elapsed:9.3f}s {memory} {num_requests:>9} {bytes_sent:>12}")
+
+        print("\nUpdater.update with a warm HTTP cache (releases loaded from compact release indexes):")
+        print(f"  {'deps':>6} {'wall':>10} {'peak mem':>10}")
+        for num_dependencies in map(int, args.deps.split(",")):
+            elapsed, peak_memory = bench_cached(fake_pypi, num_dependencies, args.jobs, args.trace_memory)
+            memory = f"{peak_memory / 1024 / 1024:8.1f}MB" if peak_memory is not None else f"{'-':>10}"
+            print(f"  {num_dependencies:>6} {elapsed:9.3f}s {memory}")
+
+        print("\nincremental Updater.update with a state file (1% of packages changed):")
+        print(f"  {'deps':>6} {'wall':>10} {'requests':>9} {'bytes':>12}")
+        for num_dependencies in map(int, args.deps.split(",")):
+            elapsed, num_requests, bytes_sent = bench_incremental(fake_pypi, num_dependencies, args.jobs)
+            print(f"  {num_dependencies:>6} {elapsed:9.3f}s {num_requests:>9} {bytes_sent:>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+# Copyright (c) 2025-2026 Corey Goldberg
+# SPDX-License-Identifier: MIT
+
+
+"""Local fake PyPI server for benchmarks.
+
+Serves synthetic simple index pages (PEP 691 JSON or PEP 503 HTML) and pypi.org JSON API documents for any package
+name, with configurable latency, number of releases and files per release, and padding per file. Also serves the
+pypi.org XML-RPC changelog (`changelog_last_serial` and `changelog_since_serial`) for packages passed to `publish`.
+"""
+
+import hashlib
+import json
+import threading
+import time
+import xmlrpc.client
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SIMPLE_JSON_CONTENT_TYPE = "application/vnd.pypi.simple.v1+json"
+REQUIRES_PYTHON = (">=3.8", ">=3.9", ">=3.10", ">=3.9,<4", ">=3.8,!=3.9.*", None)
+
+
+class FakePyPI:
+    """Fake package index running in a background thread.
+
+    Packages whose names are in `missing` return 404. Every other name has `releases` releases with `files` files each.
+    Each file entry is padded with `payload_size` bytes, to mimic the hashes, URLs and metadata of real indexes.
+    """
+
+    def __init__(self, latency=0.0, releases=20, files=3, payload_size=0, missing=()):
+        self.latency = latency
+        self.releases = releases
+        self.files = files
+        self.payload_size = payload_size
+        self.missing = set(missing)
+        self.serial = 1
+        self.changelog = []
+        self.requests = 0
+        self.bytes_sent = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._render = lru_cache(maxsize=None)(self._render_uncached)
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def reset_stats(self):
+        with self._lock:
+            self.requests = 0
+            self.bytes_sent = 0
+
+    def publish(self, name):
+        """Add a changelog event for a package, as if a new release was uploaded."""
+        with self._lock:
+            self.serial += 1
+            self.changelog.append((name, "1.0", int(time.time()), "new release", self.serial))
+
+    def _changelog_call(self, method, params):
+        with self._lock:
+            if method == "changelog_last_serial":
+                return self.serial
+            if method == "changelog_since_serial":
+                return [event for event in self.changelog if event[-1] > params[0]]
+        raise xmlrpc.client.Fault(1, f"unknown method: {method}")
+
+    def _record(self, size):
+        with self._lock:
+            self.requests += 1
+            self.bytes_sent += size
+
+    def _files(self, name):
+        padding = "0" * self.payload_size
+        for i in range(self.releases):
+            version = f"{i // 10}.{i % 10}.0"
+            requires_python = REQUIRES_PYTHON[i % len(REQUIRES_PYTHON)]
+            for j in range(self.files):
+                filename = f"{name.replace('-', '_')}-{version}-py3-none-any.whl"
+                if j == self.files - 1:
+                    filename = f"{name}-{version}.tar.gz"
+                elif j:
+                    filename = f"{name.replace('-', '_')}-{version}-cp3{j}-abi3-manylinux_2_17_x86_64.whl"
+                yield version, filename, requires_python, padding
+
+    def _render_uncached(self, name, kind):
+        if kind == "simple-json":
+            document = {
+                "meta": {"api-version": "1.1"},
+                "name": name,
+                "files": [
+                    {
+                        "filename": filename,
+                        "url": f"../../packages/{filename}#{padding}",
+                        "hashes": {"sha256": hashlib.sha256(filename.encode()).hexdigest()},
+                        "requires-python": requires_python,
+                        "yanked": False,
+                    }
+                    for _, filename, requires_python, padding in self._files(name)
+                ],
+            }
+            return SIMPLE_JSON_CONTENT_TYPE, json.dumps(document).encode()
+        if kind == "simple-html":
+            links = "".join(
+                f'<a href="../../packages/{filename}#{padding}" data-requires-python="'
+                f'{(requires_python or "").replace(">", "&gt;").replace("<", "&lt;")}">{filename}</a><br/>\n'
+                for _, filename, requires_python, padding in self._files(name)
+            )
+            return "text/html", f"<!DOCTYPE html>\n<html><body>\n{links}</body></html>\n".encode()
+        releases = {}
+        for version, filename, requires_python, padding in self._files(name):
+            releases.setdefault(version, []).append(
+                {"filename": filename, "requires_python": requires_python, "yanked": False, "comment_text": padding}
+            )
+        document = {"info": {"name": name, "description": "x" * self.payload_size}, "releases": releases}
+        return "application/json", json.dumps(document).encode()
+
+    def _make_handler(self):
+        fake_pypi = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, content_type=None, body=b"", etag=None):
+                self.send_response(status)
+                if content_type is not None:
+                    self.send_header("Content-Type", content_type)
+                if etag is not None:
+                    self.send_header("ETag", etag)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                fake_pypi._record(len(body))
+
+            def do_GET(self):
+                if fake_pypi.latency:
+                    time.sleep(fake_pypi.latency)
+                parts = [part for part in self.path.split("/") if part]
+                if len(parts) == 2 and parts[0] == "simple":
+                    name = parts[1]
+                    json_requested = SIMPLE_JSON_CONTENT_TYPE in self.headers.get("Accept", "")
+                    kind = "simple-json" if json_requested else "simple-html"
+                elif len(parts) == 3 and parts[0] == "pypi" and parts[2] == "json":
+                    name, kind = parts[1], "json-api"
+                else:
+                    self._send(404)
+                    return
+                if name in fake_pypi.missing:
+                    self._send(404)
+                    return
+                content_type, body = fake_pypi._render(name, kind)
+                etag = f'"{hashlib.sha256(body).hexdigest()[:16]}"'
+                if self.headers.get("If-None-Match") == etag:
+                    self._send(304, etag=etag)
+                    return
+                self._send(200, content_type, body, etag=etag)
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if self.path.rstrip("/") != "/pypi":
+                    self._send(404)
+                    return
+                params, method = xmlrpc.client.loads(body)
+                try:
+                    response = xmlrpc.client.dumps((fake_pypi._changelog_call(method, params),), methodresponse=True)
+                except xmlrpc.client.Fault as fault:
+                    response = xmlrpc.client.dumps(fault)
+                self._send(200, "text/xml", response.encode())
+
+        return Handler
@@ -5,21 +5,50 @@
 """Bump Python package dependencies in pyproject.toml."""
 
 import argparse
+import array
+import collections
+import contextlib
+import fnmatch
+import glob
+import hashlib
+import heapq
+import importlib.metadata
+import itertools
+import json
 import logging
+import mmap
 import os
+import queue
 import re
 import sys
-from copy import deepcopy
+import tarfile
+import tempfile
+import threading
+import time
+import zipfile
+from collections.abc import Mapping
+from concurrent.futures import Executor, Future, ThreadPoolExecutor, as_completed
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from copy import copy
+from functools import cmp_to_key, lru_cache
+from html.parser import HTMLParser
 from pathlib import Path
+from types import MappingProxyType
+from typing import NamedTuple
+from urllib.parse import urldefrag, urljoin, urlsplit
 
-import requests
-import requirements
-import tomlkit
-from packaging.requirements import InvalidRequirement
 from packaging.specifiers import SpecifierSet
+from packaging.utils import (
+    InvalidSdistFilename,
+    InvalidWheelFilename,
+    canonicalize_name,
+    parse_sdist_filename,
+    parse_wheel_filename,
+)
 from packaging.version import InvalidVersion, Version
-from validate_pyproject import api as validate_pyproject_api
-from validate_pyproject.errors import ValidationError
+
+# requests, tomlkit and validate_pyproject are imported where they are used, so `--help` and runs that
+# don't need them start fast
 
 
 def _setup_logger(name="updater"):
@@ -38,12 +67,1345 @@ def _setup_logger(name="updater"):
 logger = _setup_logger()
 
 
+DEFAULT_JOBS = 8
+DEFAULT_INDEX_URL = "https://pypi.org/simple"
+SIMPLE_JSON_CONTENT_TYPE = "application/vnd.pypi.simple.v1+json"
+SIMPLE_HTML_CONTENT_TYPES = ("application/vnd.pypi.simple.v1+html", "text/html")
+SIMPLE_ACCEPT = f"{SIMPLE_JSON_CONTENT_TYPE}, application/vnd.pypi.simple.v1+html;q=0.2, text/html;q=0.1"
+DEFAULT_RETRIES = 3
+REQUEST_TIMEOUT = 10  # seconds, until enough latencies were observed to adapt it
+MIN_REQUEST_TIMEOUT = 2  # seconds
+TIMEOUT_LATENCY_FACTOR = 4  # adaptive timeouts are this many times the 99th percentile latency
+MIN_HEDGE_DELAY = 0.05  # seconds
+DEFAULT_CACHE_TTL = 600  # seconds
+DEFAULT_NEGATIVE_CACHE_TTL = 3600  # seconds
+DEFAULT_CACHE_MAX_SIZE = 256 * 1024 * 1024  # bytes
+DEFAULT_SERVE_HOST = "127.0.0.1"
+DEFAULT_SERVE_PORT = 7755
+SERVE_TIMEOUT = 600  # seconds
+RELEASE_INDEX_MMAP_SIZE = 64 * 1024  # bytes, smaller release indexes are read instead of memory-mapped
+MAX_FALLBACK_ROUNDS = 3
+MAX_FALLBACK_CANDIDATES = 5  # older releases whose metadata is checked per conflicting package
+
+
+class BumpDependenciesError(Exception):
+    """Base class of the errors raised by bump_dependencies."""
+
+
+class PyprojectError(BumpDependenciesError):
+    """pyproject.toml is missing, invalid, or has no dependencies to update."""
+
+
+class RequiresPythonError(BumpDependenciesError, ValueError):
+    """A requires-python specifier, from pyproject.toml or the package index, is invalid."""
+
+
+def default_cache_dir():
+    if sys.platform == "win32":
+        base_dir = os.environ.get("LOCALAPPDATA", os.path.expanduser("~\\AppData\\Local"))
+    elif sys.platform == "darwin":
+        base_dir = os.path.expanduser("~/Library/Caches")
+    else:
+        base_dir = os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache"))
+    return os.path.join(base_dir, "bump_dependencies")
+
+
+# Version intervals are `(lower, lower_inclusive, upper, upper_inclusive)` tuples, where an unbounded side is None.
+_UNBOUNDED = (None, False, None, False)
+
+
+def _prefix_bounds(version):
+    """Return the versions bounding the prefix match `version.*` as `(lower, upper)`."""
+    release = version.release
+    epoch = f"{version.epoch}!" if version.epoch else ""
+    next_release = (*release[:-1], release[-1] + 1)
+    lower = Version(f"{epoch}{'.'.join(map(str, release))}.dev0")
+    upper = Version(f"{epoch}{'.'.join(map(str, next_release))}.dev0")
+    return lower, upper
+
+
+def _specifier_intervals(specifier):
+    """Convert a single version specifier clause into a tuple of disjoint intervals."""
+    operator, version_str = specifier.operator, specifier.version
+    if version_str.endswith(".*"):
+        lower, upper = _prefix_bounds(Version(version_str[:-2]))
+        if operator == "==":
+            return ((lower, True, upper, False),)
+        return ((None, False, lower, False), (upper, True, None, False))  # !=
+    if operator == "===":
+        try:
+            version = Version(version_str)
+        except InvalidVersion:
+            return (_UNBOUNDED,)  # arbitrary string, can't reason about it
+        return ((version, True, version, True),)
+    version = Version(version_str)
+    if operator == "==":
+        return ((version, True, version, True),)
+    if operator == "!=":
+        return ((None, False, version, False), (version, False, None, False))
+    if operator == ">=":
+        return ((version, True, None, False),)
+    if operator == ">":
+        return ((version, False, None, False),)
+    if operator == "<=":
+        return ((None, False, version, True),)
+    if operator == "<":
+        if not (version.is_prerelease or version.is_postrelease):
+            version = Version(f"{version}.dev0")  # <V excludes pre-releases of V
+        return ((None, False, version, False),)
+    # ~=X.Y is >=X.Y,==X.*
+    _, upper = _prefix_bounds(Version(".".join(map(str, version.release[:-1]))))
+    return ((version, True, upper, False),)
+
+
+def _intersect_intervals(a, b):
+    a_lower, a_lower_inclusive, a_upper, a_upper_inclusive = a
+    b_lower, b_lower_inclusive, b_upper, b_upper_inclusive = b
+    if a_lower is None or (b_lower is not None and (b_lower, not b_lower_inclusive) > (a_lower, not a_lower_inclusive)):
+        lower, lower_inclusive = b_lower, b_lower_inclusive
+    else:
+        lower, lower_inclusive = a_lower, a_lower_inclusive
+    if a_upper is None or (b_upper is not None and (b_upper, b_upper_inclusive) < (a_upper, a_upper_inclusive)):
+        upper, upper_inclusive = b_upper, b_upper_inclusive
+    else:
+        upper, upper_inclusive = a_upper, a_upper_inclusive
+    if (
+        lower is not None
+        and upper is not None
+        and (lower > upper or (lower == upper and not (lower_inclusive and upper_inclusive)))
+    ):
+        return None
+    return lower, lower_inclusive, upper, upper_inclusive
+
+
+def _intersect_interval_sets(a, b):
+    intervals = (_intersect_intervals(x, y) for x in a for y in b)
+    return tuple(interval for interval in intervals if interval is not None)
+
+
+@lru_cache(maxsize=1024)
+def compile_requires_python(requires_python):
+    """Compile a requires-python specifier string into a tuple of disjoint version intervals.
+
+    Exclusions (`!=`) and prefix matches (`==3.9.*`, `!=3.9.*`) are modeled exactly. Raises `InvalidSpecifier` if
+    the string isn't a valid specifier set.
+    """
+    intervals = (_UNBOUNDED,)
+    for specifier in SpecifierSet(requires_python):
+        intervals = _intersect_interval_sets(intervals, _specifier_intervals(specifier))
+    return intervals
+
+
+def _check_requires_python(requires_python):
+    """Raise `RequiresPythonError` if a requires-python specifier string is invalid."""
+    try:
+        compile_requires_python(requires_python)
+    except Exception as e:
+        raise RequiresPythonError(f"invalid requires-python specifier '{requires_python}': {e}") from e
+
+
+@lru_cache(maxsize=4096)
+def requires_python_intersects(requires_python_a, requires_python_b):
+    """Check if any version could satisfy both requires-python specifier strings."""
+    a = compile_requires_python(requires_python_a)
+    b = compile_requires_python(requires_python_b)
+    return bool(_intersect_interval_sets(a, b))
+
+
+_VERSION_CLAUSE_RE = re.compile(r"(===|==|~=|>=|>)\s*([^\s,;)]+)")
+
+
+class Resolution(NamedTuple):
+    """The result of resolving one package with `Updater.resolve_many`.
+
+    `name` is the normalized package name, and `version` the newest compatible stable release, or None with the
+    `reason` it couldn't be resolved. `seconds` is the time spent resolving the package: 0.0 if it was already
+    resolved, and None if it was skipped at the deadline.
+    """
+
+    name: str
+    version: str | None
+    reason: str | None
+    seconds: float | None
+
+
+class DependencySpecifier(NamedTuple):
+    """A parsed dependency specifier with a single version clause that can be updated.
+
+    `dependency_name` is the name with extras as written (without whitespace), and `version_span` is the
+    `(start, end)` position of the version in `text`, so the specifier can be rewritten without touching anything
+    else.
+    """
+
+    text: str
+    name: str
+    extras: tuple
+    dependency_name: str
+    operator: str
+    version: str
+    marker: str | None
+    version_span: tuple
+
+    def with_version(self, version):
+        start, end = self.version_span
+        return f"{self.text[:start]}{version}{self.text[end:]}"
+
+
+class Edit(NamedTuple):
+    """A dependency specifier changed by an update.
+
+    `group` is the key path of the dependency array in pyproject.toml, like `("project", "dependencies")` or
+    `("dependency-groups", "dev")`, and `index` is the position of the specifier in that array.
+    """
+
+    group: tuple
+    index: int
+    old: str
+    new: str
+
+
+class Conflict(NamedTuple):
+    """A requirement of a bumped release that excludes the version pinned for another dependency.
+
+    `specifier` is the bumped dependency specifier, `requirement` is the `Requires-Dist` entry from the metadata of
+    its new release, and `pinned` is the specifier of the other dependency.
+    """
+
+    specifier: str
+    requirement: str
+    pinned: str
+
+
+@lru_cache(maxsize=8192)
+def _parse_dependency_specifier(text):
+    from packaging.requirements import InvalidRequirement, Requirement
+
+    illegal_chars = ("/", ":", "@")
+    if any(char in text for char in illegal_chars):
+        return None, f"can't handle direct reference dependency specifier: '{text}'"
+    try:
+        requirement = Requirement(text)
+    except InvalidRequirement:
+        return None, f"skipping invalid dependency specifier: '{text}'"
+    requirement_text = text.split(";")[0]
+    operators = [specifier.operator for specifier in requirement.specifier]
+    invalid_operators = ("!=", "<=", "<")
+    for op in invalid_operators:
+        if op in operators:
+            return None, f"skipping unsupported version identifier: '{op}'"
+    if not operators:
+        return None, f"no version specified: '{requirement_text}'"
+    if len(operators) != 1:
+        return None, f"can't handle complex dependency specifier: '{requirement_text}'"
+    match = _VERSION_CLAUSE_RE.search(requirement_text)
+    # PEP 508 allows the version clause in parentheses, like 'foo (==1.0)'
+    dependency_name = requirement_text[: match.start()].replace(" ", "").strip().removesuffix("(")
+    extras = ()
+    if "[" in dependency_name:
+        extras = tuple(extra for extra in dependency_name.partition("[")[2].rstrip("]").split(",") if extra)
+    parsed = DependencySpecifier(
+        text=text,
+        name=requirement.name,
+        extras=extras,
+        dependency_name=dependency_name,
+        operator=match.group(1),
+        version=match.group(2),
+        marker=str(requirement.marker) if requirement.marker is not None else None,
+        version_span=match.span(2),
+    )
+    return parsed, None
+
+
+def parse_dependency_specifier(text):
+    """Parse a dependency specifier with a single updatable version clause (`==`, `===`, `~=`, `>=` or `>`).
+
+    Results are cached, so each distinct specifier is parsed once per process. Raises ValueError with the reason the
+    specifier can't be updated.
+    """
+    parsed, error = _parse_dependency_specifier(str(text))
+    if error is not None:
+        raise ValueError(error)
+    return parsed
+
+
+def find_release_conflicts(dependency_specifier, requirements, pinned_versions):
+    """Return a `Conflict` for every requirement of a release that excludes a pinned version of another package.
+
+    `requirements` are the release's `Requires-Dist` entries as `packaging.requirements.Requirement` objects, and
+    `pinned_versions` maps normalized package names to `(version, specifier)` pairs. Requirements behind markers
+    are only checked if the marker matches the running interpreter, or one of the extras of `dependency_specifier`.
+    """
+    parsed = parse_dependency_specifier(dependency_specifier)
+    package_name = canonicalize_name(parsed.name)
+    conflicts = []
+    for requirement in requirements:
+        other_name = canonicalize_name(requirement.name)
+        if other_name == package_name or other_name not in pinned_versions:
+            continue
+        if requirement.marker is not None and not any(
+            requirement.marker.evaluate({"extra": extra}) for extra in ("", *parsed.extras)
+        ):
+            continue
+        for version, pinned in pinned_versions[other_name]:
+            if not requirement.specifier.contains(version, prereleases=True):
+                conflicts.append(Conflict(str(dependency_specifier), str(requirement), pinned))
+    return conflicts
+
+
+def python_version_spec(python_version):
+    """Return the requires-python specifier of a Python minor version, like `==3.12.*` for `3.12`."""
+    return f"=={python_version}.*"
+
+
+def split_by_python_version(dependency_specifier, new_versions):
+    """Split a dependency specifier into one specifier per range of target Pythons sharing the same new version.
+
+    `new_versions` maps Python minor versions (like `3.12`) to the new version for that Python, or None if it has no
+    compatible release. Each specifier gets a `python_version` marker for its range, combined with the original
+    marker, and the lowest and highest ranges are left open. Targets without a compatible release are left out.
+    """
+    parsed = parse_dependency_specifier(dependency_specifier)
+    ranges = []
+    for python_version in sorted(new_versions, key=Version):
+        new_version = new_versions[python_version]
+        if ranges and ranges[-1][0] == new_version:
+            ranges[-1][1].append(python_version)
+        else:
+            ranges.append((new_version, [python_version]))
+    specifiers = []
+    for i, (new_version, python_versions) in enumerate(ranges):
+        if new_version is None:
+            continue
+        conditions = []
+        if i > 0:
+            conditions.append(f'python_version >= "{python_versions[0]}"')
+        if i < len(ranges) - 1:
+            conditions.append(f'python_version < "{ranges[i + 1][1][0]}"')
+        marker = " and ".join(conditions)
+        if parsed.marker is not None:
+            marker = f"({parsed.marker}) and {marker}" if marker else parsed.marker
+        requirement = parsed.with_version(new_version).split(";")[0].strip()
+        specifiers.append(f"{requirement}; {marker}" if marker else requirement)
+    return specifiers
+
+
+class HTTPCache:
+    """Persistent on-disk cache of HTTP responses, keyed by URL.
+
+    Each entry is stored as a body file and a metadata file containing the response's `ETag` and `Last-Modified`
+    headers, so stale entries can be revalidated with a conditional request, and the body's SHA-256 digest, which
+    identifies the release index decoded from it. Entries younger than `ttl` seconds are used without revalidation.
+    When the cache grows beyond `max_size` bytes, the least recently used entries are evicted.
+    """
+
+    def __init__(self, cache_dir=None, ttl=DEFAULT_CACHE_TTL, max_size=DEFAULT_CACHE_MAX_SIZE):
+        self.cache_dir = cache_dir if cache_dir is not None else default_cache_dir()
+        self.ttl = ttl
+        self.max_size = max_size
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _paths(self, url):
+        key = hashlib.sha256(url.encode()).hexdigest()
+        return os.path.join(self.cache_dir, f"{key}.body"), os.path.join(self.cache_dir, f"{key}.json")
+
+    def _write_atomic(self, path, content):
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def get_meta(self, url):
+        """Return the metadata of a cached URL, or None if it isn't cached."""
+        _, meta_path = self._paths(url)
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return meta if meta.get("url") == url else None
+
+    def get(self, url):
+        """Return `(meta, body)` for a cached URL, or None if it isn't cached."""
+        meta = self.get_meta(url)
+        if meta is None:
+            return None
+        body_path, _ = self._paths(url)
+        try:
+            with open(body_path, "rb") as f:
+                body = f.read()
+            os.utime(body_path)  # mark as recently used
+        except OSError:
+            return None
+        return meta, body
+
+    def is_fresh(self, meta):
+        return time.time() - meta.get("stored_at", 0) < self.ttl
+
+    def conditional_headers(self, meta):
+        headers = {}
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+        return headers
+
+    def store(self, url, response):
+        body_path, meta_path = self._paths(url)
+        meta = {
+            "url": url,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "content_type": response.headers.get("Content-Type", ""),
+            "sha256": hashlib.sha256(response.content).hexdigest(),
+            "stored_at": time.time(),
+        }
+        self._write_atomic(body_path, response.content)
+        self._write_atomic(meta_path, json.dumps(meta).encode())
+
+    def get_releases(self, url, digest):
+        """Return the `ReleaseIndex` stored for a URL, or None if there is none for the body with this digest."""
+        body_path, _ = self._paths(url)
+        try:
+            releases = ReleaseIndex.load(body_path.removesuffix(".body") + ".releases")
+        except (OSError, ValueError):
+            return None
+        return releases if releases.digest == digest else None
+
+    def get_fresh_releases(self, url):
+        """Return the `ReleaseIndex` of a fresh entry, or None, using only the entry's metadata and never its body."""
+        meta = self.get_meta(url)
+        if meta is None or not self.is_fresh(meta) or not meta.get("sha256"):
+            return None
+        releases = self.get_releases(url, bytes.fromhex(meta["sha256"]))
+        if releases is not None:
+            body_path, _ = self._paths(url)
+            with contextlib.suppress(OSError):
+                os.utime(body_path)  # mark as recently used
+        return releases
+
+    def store_releases(self, url, digest, releases):
+        """Store releases decoded from a URL's body, whose digest is `digest`, as a compact `ReleaseIndex`."""
+        body_path, _ = self._paths(url)
+        self._write_atomic(body_path.removesuffix(".body") + ".releases", ReleaseIndex.encode(releases, digest))
+
+    def refresh(self, url, meta):
+        """Restart the TTL of an entry after the server confirmed it is unchanged (304)."""
+        _, meta_path = self._paths(url)
+        meta["stored_at"] = time.time()
+        self._write_atomic(meta_path, json.dumps(meta).encode())
+
+    def evict(self):
+        """Delete least recently used entries until the cache fits within `max_size` bytes.
+
+        Every file of an entry counts toward the size: the body, the metadata and the release index.
+        """
+        entries = {}
+        total_size = 0
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                key, _, suffix = entry.name.partition(".")
+                if suffix not in ("body", "json", "releases") or not entry.is_file():
+                    continue
+                stat = entry.stat()
+                last_used, size, paths = entries.get(key, (0, 0, []))
+                entries[key] = (max(last_used, stat.st_mtime), size + stat.st_size, [*paths, entry.path])
+                total_size += stat.st_size
+        for _, size, paths in sorted(entries.values()):
+            if total_size <= self.max_size:
+                break
+            for path in paths:
+                with contextlib.suppress(FileNotFoundError):
+                    os.unlink(path)
+            total_size -= size
+
+
+# heap key ordering versions newest first
+_newest_first = cmp_to_key(lambda a, b: (a < b) - (a > b))
+
+
+def _parse_version(ver_str):
+    try:
+        return Version(ver_str)
+    except InvalidVersion:
+        return None
+
+
+def _get_file_version(filename):
+    try:
+        if filename.endswith(".whl"):
+            _, version, _, _ = parse_wheel_filename(filename)
+        else:
+            _, version = parse_sdist_filename(filename)
+    except (InvalidWheelFilename, InvalidSdistFilename, InvalidVersion):
+        return None
+    return str(version)
+
+
+@lru_cache(maxsize=1024)
+def _file_info(requires_python, yanked):
+    # shared and read-only: a release usually has many files with the same requires-python
+    return MappingProxyType({"requires_python": requires_python, "yanked": yanked})
+
+
+def _add_release_version_file(releases, version, requires_python, yanked):
+    file_info = _file_info(requires_python, yanked)
+    files = releases.setdefault(version, [])
+    if not any(other is file_info for other in files):
+        files.append(file_info)
+
+
+def _add_release_file(releases, filename, requires_python, yanked):
+    version = _get_file_version(filename)
+    if version is not None:
+        _add_release_version_file(releases, version, requires_python, yanked)
+
+
+def _compact_file_entry(obj):
+    """JSON object hook reducing file entries to `(filename, requires_python, yanked)` as soon as they're decoded."""
+    if "filename" in obj or "requires_python" in obj:
+        requires_python = obj.get("requires-python", obj.get("requires_python"))
+        return obj.get("filename", ""), requires_python, bool(obj.get("yanked"))
+    return obj
+
+
+def decode_releases(content):
+    """Decode a PEP 691 JSON project page or a pypi.org JSON API document into releases.
+
+    Only the filename, requires-python and yanked status of each file are kept, and hashes, URLs and other metadata
+    are dropped while decoding, so large release histories are never held in memory as full documents. Files of the
+    same release that share requires-python and yanked status are stored once.
+    """
+    data = json.loads(content, object_hook=_compact_file_entry)
+    releases = {}
+    if "files" in data:
+        for filename, requires_python, yanked in data["files"]:
+            _add_release_file(releases, filename, requires_python, yanked)
+        return releases
+    for version, files in data.get("releases", {}).items():
+        for _, requires_python, yanked in files:
+            _add_release_version_file(releases, version, requires_python, yanked)
+    return releases
+
+
+class _SimpleHTMLParser(HTMLParser):
+    def __init__(self):
+        super().__init__()
+        self.releases = {}
+        self._attrs = None
+        self._text = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "a":
+            self._attrs = dict(attrs)
+            self._text = []
+
+    def handle_data(self, data):
+        if self._attrs is not None:
+            self._text.append(data)
+
+    def handle_endtag(self, tag):
+        if tag == "a" and self._attrs is not None:
+            filename = "".join(self._text).strip()
+            yanked = "data-yanked" in self._attrs
+            _add_release_file(self.releases, filename, self._attrs.get("data-requires-python"), yanked)
+            self._attrs = None
+
+
+def releases_from_simple_html(html):
+    """Group the files of a PEP 503 HTML project page by release version."""
+    parser = _SimpleHTMLParser()
+    parser.feed(html)
+    parser.close()
+    return parser.releases
+
+
+class ReleaseIndex(Mapping):
+    """Read-only release history of a package, backed by a compact binary buffer that can be memory-mapped.
+
+    The buffer (see `encode`) holds a digest of the document the releases were decoded from, a header, then arrays
+    of native unsigned 32-bit integers: one `(version offset, version length, flags, first file)` record per
+    version, sorted newest first, one `requires_python index << 1 | yanked` code per distinct file info, and one
+    `(offset, length)` record per distinct requires-python string. Version and requires-python strings follow as
+    UTF-8. Nothing is decoded up front, so loading costs microseconds and almost no heap, and walking the newest
+    versions needs no version parsing or sorting.
+
+    Behaves like the `{version: [file info, ...]}` dicts returned by `decode_releases`.
+    """
+
+    MAGIC = 0x49524442  # b"BDRI" on little-endian machines, so indexes written with another byte order are rejected
+    FORMAT = 1
+    DIGEST_SIZE = 32
+    PRERELEASE = 1
+    INVALID = 2
+
+    def __init__(self, buffer):
+        view = memoryview(buffer)
+        header = view[self.DIGEST_SIZE : self.DIGEST_SIZE + 24].cast("I")
+        magic, format_version, num_versions, num_files, num_requires, strings_size = header
+        if magic != self.MAGIC or format_version != self.FORMAT:
+            raise ValueError("not a release index")
+        start = self.DIGEST_SIZE + 24
+        end = start + 4 * (4 * num_versions + num_files + 2 * num_requires)
+        if len(view) != end + strings_size:
+            raise ValueError("truncated release index")
+        ints = view[start:end].cast("I")
+        self.digest = bytes(view[: self.DIGEST_SIZE])
+        self._versions = ints[: 4 * num_versions]
+        self._files = ints[4 * num_versions : 4 * num_versions + num_files]
+        self._requires = ints[4 * num_versions + num_files :]
+        self._strings = view[end:]
+        self._num_versions = num_versions
+        self._positions = None
+
+    @classmethod
+    def encode(cls, releases, digest):
+        """Encode a `{version: [file info, ...]}` mapping into the binary format read by `ReleaseIndex`."""
+        parsed = [(_parse_version(ver_str), ver_str) for ver_str in releases]
+        valid = sorted((item for item in parsed if item[0] is not None), key=lambda item: item[0], reverse=True)
+        ordered = valid + [item for item in parsed if item[0] is None]
+        strings = bytearray()
+        requires_indexes = {None: 0}
+        requires = array.array("I")
+        versions = array.array("I")
+        files = array.array("I")
+
+        def add_string(value):
+            encoded = value.encode()
+            strings.extend(encoded)
+            return len(strings) - len(encoded), len(encoded)
+
+        for ver, ver_str in ordered:
+            flags = cls.INVALID if ver is None else cls.PRERELEASE if ver.is_prerelease else 0
+            versions.extend((*add_string(ver_str), flags, len(files)))
+            for file_info in releases[ver_str]:
+                requires_python = file_info.get("requires_python")
+                if requires_python not in requires_indexes:
+                    requires_indexes[requires_python] = len(requires_indexes)
+                    requires.extend(add_string(requires_python))
+                files.append(requires_indexes[requires_python] << 1 | bool(file_info.get("yanked")))
+        header = array.array("I", (cls.MAGIC, cls.FORMAT, len(ordered), len(files), len(requires) // 2, len(strings)))
+        return b"".join((digest, header.tobytes(), versions.tobytes(), files.tobytes(), requires.tobytes(), strings))
+
+    @classmethod
+    def load(cls, path):
+        """Load a release index file, memory-mapping it if it is large. Raises OSError or ValueError."""
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size < RELEASE_INDEX_MMAP_SIZE:
+                return cls(f.read())
+            return cls(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def _string(self, offset, length):
+        return bytes(self._strings[offset : offset + length]).decode()
+
+    def _version(self, position):
+        offset, length = self._versions[4 * position : 4 * position + 2]
+        return self._string(offset, length)
+
+    def _release_files(self, position):
+        start = self._versions[4 * position + 3]
+        end = self._versions[4 * position + 7] if position + 1 < self._num_versions else len(self._files)
+        release_files = []
+        for code in self._files[start:end]:
+            requires_index = code >> 1
+            requires_python = None
+            if requires_index:
+                requires_python = self._string(*self._requires[2 * requires_index - 2 : 2 * requires_index])
+            release_files.append(_file_info(requires_python, bool(code & 1)))
+        return release_files
+
+    def iter_stable_newest_first(self):
+        """Yield `(version string, files)` for stable releases, newest first, without parsing or sorting versions."""
+        for position in range(self._num_versions):
+            if not self._versions[4 * position + 2]:
+                yield self._version(position), self._release_files(position)
+
+    def __getitem__(self, ver_str):
+        if self._positions is None:
+            self._positions = {self._version(position): position for position in range(self._num_versions)}
+        return self._release_files(self._positions[ver_str])
+
+    def __iter__(self):
+        return (self._version(position) for position in range(self._num_versions))
+
+    def __len__(self):
+        return self._num_versions
+
+
+class _SimpleHTMLLinkParser(_SimpleHTMLParser):
+    def __init__(self):
+        super().__init__()
+        self.links = []
+
+    def handle_endtag(self, tag):
+        if tag == "a" and self._attrs is not None:
+            metadata = self._attrs.get("data-core-metadata", self._attrs.get("data-dist-info-metadata"))
+            has_metadata = "data-core-metadata" in self._attrs or "data-dist-info-metadata" in self._attrs
+            filename = "".join(self._text).strip()
+            self.links.append((filename, self._attrs.get("href", ""), has_metadata and metadata != "false"))
+        super().handle_endtag(tag)
+
+
+def metadata_urls_from_simple_page(content_type, content, page_url, version):
+    """Return the URLs of the PEP 658 metadata files of a release listed on a simple project page, wheels first.
+
+    Only files the index marks as having metadata (`core-metadata`, or `dist-info-metadata` before PEP 714) are
+    included. Returns an empty list for releases without metadata files and for unknown page formats.
+    """
+    if content_type.startswith(SIMPLE_JSON_CONTENT_TYPE):
+        links = [
+            (
+                file_info.get("filename", ""),
+                file_info.get("url", ""),
+                bool(file_info.get("core-metadata", file_info.get("dist-info-metadata"))),
+            )
+            for file_info in json.loads(content).get("files", [])
+        ]
+    elif content_type.startswith(SIMPLE_HTML_CONTENT_TYPES):
+        parser = _SimpleHTMLLinkParser()
+        parser.feed(content.decode())
+        parser.close()
+        links = parser.links
+    else:
+        return []
+    urls = [
+        urldefrag(urljoin(page_url, url)).url + ".metadata"
+        for filename, url, has_metadata in sorted(links, key=lambda link: not link[0].endswith(".whl"))
+        if has_metadata and _get_file_version(filename) == version
+    ]
+    return list(dict.fromkeys(urls))
+
+
+class SimpleIndex:
+    """Remote package index serving the simple repository API, like pypi.org or a devpi/bandersnatch mirror.
+
+    The PEP 691 JSON format is requested, but PEP 503 HTML pages are accepted too. Indexes whose URL ends in
+    `/simple` are assumed to also serve the pypi.org JSON API, which is used as a fallback, and the pypi.org XML-RPC
+    changelog, which is used for incremental runs.
+    """
+
+    def __init__(self, index_url=DEFAULT_INDEX_URL, mirror_url=None):
+        self.index_url = index_url.rstrip("/")
+        self.mirror_url = mirror_url.rstrip("/") if mirror_url is not None else None
+        self.name = urlsplit(self.index_url).netloc
+        self.json_api_url = None
+        self.xmlrpc_url = None
+        if self.index_url.endswith("/simple"):
+            self.json_api_url = self.index_url.removesuffix("/simple") + "/pypi/{package_name}/json"
+            self.xmlrpc_url = self.index_url.removesuffix("/simple") + "/pypi"
+
+    def hedge_url(self, url):
+        """Return the URL to send a hedged duplicate of a request to: the same page on the mirror, if there is one."""
+        if self.mirror_url is not None and url.startswith(f"{self.index_url}/"):
+            return self.mirror_url + url.removeprefix(self.index_url)
+        return url
+
+    def last_serial(self, updater):
+        """Return the index's current changelog serial, or None if the index has no changelog."""
+        if self.xmlrpc_url is None:
+            return None
+        return updater.call_xmlrpc(self.xmlrpc_url, "changelog_last_serial")
+
+    def changed_since(self, updater, serial, until):
+        """Return the normalized names of packages changed after `serial` up to serial `until`.
+
+        pypi.org returns a limited number of changelog events per call, so the changelog is read page by page until
+        `until` is reached. Returns None if the index has no changelog, or it can't be read up to `until`.
+        """
+        if self.xmlrpc_url is None:
+            return None
+        changed = set()
+        while serial < until:
+            events = updater.call_xmlrpc(self.xmlrpc_url, "changelog_since_serial", serial)
+            if not events or events[-1][-1] <= serial:
+                return None
+            changed.update(canonicalize_name(name) for name, *_ in events)
+            serial = events[-1][-1]
+        return changed
+
+    def project_url(self, package_name):
+        """Return the URL of a package's project page."""
+        return f"{self.index_url}/{package_name}/"
+
+    def metadata_urls(self, updater, package_name, version):
+        """Return the URLs of the PEP 658 metadata files of a release, wheels first.
+
+        The project page is usually still in the HTTP cache from resolving the package, so this rarely hits the index.
+        """
+        page_url = self.project_url(package_name)
+        result = updater.fetch(page_url, accept=SIMPLE_ACCEPT)
+        if result is None:
+            return []
+        content_type, content = result
+        return metadata_urls_from_simple_page(content_type, content, page_url, version)
+
+    def fetch_releases(self, updater, package_name):
+        """Return the releases of a package, or None if it can't be found.
+
+        The pypi.org JSON API is only used when the project page comes back in a format that can't be parsed. A 404 or
+        an unreachable index is final, so a missing package costs a single request.
+        """
+        # with a state file, the releases found are recorded as current at the index's serial, so even fresh cached
+        # pages must be revalidated
+        revalidate = updater.state is not None
+        url = self.project_url(package_name)
+        releases = None if revalidate else updater.get_cached_releases(url)
+        if releases is not None:
+            return releases
+        result = updater.fetch(url, accept=SIMPLE_ACCEPT, revalidate=revalidate)
+        if result is None:
+            return None
+        content_type, content = result
+        if content_type.startswith(SIMPLE_JSON_CONTENT_TYPE):
+            return updater.load_releases(url, content, decode_releases)
+        if content_type.startswith(SIMPLE_HTML_CONTENT_TYPES):
+            return updater.load_releases(url, content, lambda html: releases_from_simple_html(html.decode()))
+        if self.json_api_url is None:
+            return None
+        url = self.json_api_url.format(package_name=package_name)
+        releases = None if revalidate else updater.get_cached_releases(url)
+        if releases is not None:
+            return releases
+        result = updater.fetch(url, revalidate=revalidate)
+        if result is None:
+            return None
+        return updater.load_releases(url, result[1], decode_releases)
+
+
+class SnapshotIndex:
+    """Offline package index reading pre-fetched per-package JSON documents from local disk.
+
+    `path` is a directory, or a .zip or .tar(.gz) archive, holding one `<normalized-name>.json` file per package. Each
+    file contains either a PEP 691 JSON project page or a pypi.org JSON API document. Archive members are only read
+    when their package is looked up.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.name = os.path.basename(os.path.normpath(path))
+        self._members = None
+        self._archive = None
+        self._lock = threading.Lock()
+        if zipfile.is_zipfile(path):
+            self._archive = zipfile.ZipFile(path)
+            self._members = {self._get_member_package_name(name): name for name in self._archive.namelist()}
+        elif os.path.isfile(path):
+            self._archive = tarfile.open(path)  # noqa: SIM115
+            self._members = {
+                self._get_member_package_name(member.name): member
+                for member in self._archive.getmembers()
+                if member.isfile()
+            }
+        elif not os.path.isdir(path):
+            raise FileNotFoundError(f"no offline index found: {path}")
+
+    def _get_member_package_name(self, member_name):
+        return canonicalize_name(os.path.basename(member_name).removesuffix(".json"))
+
+    def _read(self, package_name):
+        if self._members is None:
+            try:
+                with open(os.path.join(self.path, f"{package_name}.json"), "rb") as f:
+                    return f.read()
+            except FileNotFoundError:
+                return None
+        member = self._members.get(package_name)
+        if member is None:
+            return None
+        # archive members are read through one shared file object
+        with self._lock:
+            if isinstance(self._archive, tarfile.TarFile):
+                return self._archive.extractfile(member).read()
+            return self._archive.read(member)
+
+    def last_serial(self, updater):  # noqa: ARG002
+        return None
+
+    def changed_since(self, updater, serial, until):  # noqa: ARG002
+        return None
+
+    def hedge_url(self, url):
+        return url
+
+    def metadata_urls(self, updater, package_name, version):  # noqa: ARG002
+        return []  # snapshots don't hold metadata files
+
+    def fetch_releases(self, updater, package_name):
+        updater.stats.set(cache="offline")
+        content = self._read(canonicalize_name(package_name))
+        if content is None:
+            return None
+        updater.stats.add(bytes_received=len(content))
+        with updater.stats.timer("decode_seconds"):
+            return decode_releases(content)
+
+
+class _DaemonThreadPoolExecutor(Executor):
+    """Thread pool for work that may be abandoned, like lookups still running when the deadline passes.
+
+    Workers are daemon threads, so unlike `ThreadPoolExecutor` workers, they aren't joined when the interpreter exits.
+    """
+
+    def __init__(self, max_workers):
+        self.max_workers = max_workers
+        self._queue = queue.SimpleQueue()
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def submit(self, fn, /, *args, **kwargs):
+        future = Future()
+        self._queue.put((future, fn, args, kwargs))
+        with self._lock:
+            if len(self._threads) < self.max_workers:
+                thread = threading.Thread(target=self._work, daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        return future
+
+    def _work(self):
+        while (item := self._queue.get()) is not None:
+            future, fn, args, kwargs = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+
+    def shutdown(self, wait=True, *, cancel_futures=False):
+        if cancel_futures:
+            with contextlib.suppress(queue.Empty):
+                while True:
+                    self._queue.get_nowait()[0].cancel()
+        with self._lock:
+            threads, self._threads = self._threads, []
+        for _ in threads:
+            self._queue.put(None)
+        if wait:
+            for thread in threads:
+                thread.join()
+
+
+class MultiIndex:
+    """Several package indexes queried as one, like pypi.org and an internal index.
+
+    `indexes` are in priority order. Packages whose normalized name matches a glob pattern in `routes` (a list of
+    `(pattern, index)` pairs, first match wins) are only looked up on that index. Other packages are looked up on all
+    indexes in parallel, and the releases of the highest-priority index that has the package are used, without
+    waiting for lower-priority indexes. A lower-priority index is only used when every higher-priority one answered
+    that it doesn't have the package, never when one is unreachable. Releases from different indexes are never mixed,
+    so a public package can't shadow a private one. With a `negative_cache`, indexes whose project page for a package
+    was a 404 aren't asked for it again until the entry expires.
+    """
+
+    def __init__(self, indexes, routes=(), negative_cache=None, jobs=DEFAULT_JOBS):
+        self.indexes = list(indexes)
+        self.routes = [(canonicalize_name(pattern), index) for pattern, index in routes]
+        self.negative_cache = negative_cache
+        self.name = " + ".join(index.name for index in self.indexes)
+        self._sources = {}
+        # lower-priority lookups are abandoned once a higher-priority index answers
+        self._executor = _DaemonThreadPoolExecutor(max_workers=max(1, (len(self.indexes) - 1) * jobs))
+
+    def last_serial(self, updater):  # noqa: ARG002
+        return None  # there is no changelog serial common to several indexes
+
+    def changed_since(self, updater, serial, until):  # noqa: ARG002
+        return None
+
+    def get_route(self, package_name):
+        """Return the index a package is routed to, or None if it is looked up on every index."""
+        package_name = canonicalize_name(package_name)
+        for pattern, index in self.routes:
+            if fnmatch.fnmatchcase(package_name, pattern):
+                return index
+        return None
+
+    def _fetch_releases(self, updater, index, package_name):
+        """Return `(releases, missing)`, where `missing` is True if the index definitely doesn't have the package."""
+        releases = index.fetch_releases(updater, package_name)
+        if releases is not None:
+            return releases, False
+        if not hasattr(index, "project_url"):
+            return None, True  # a local snapshot is complete
+        # only the project page's own 404 means the package is missing, not an unreachable index or a failed fallback
+        if updater.last_fetch_error(index.project_url(package_name)) != 404:
+            return None, False
+        if self.negative_cache is not None:
+            self.negative_cache.add(index.index_url, package_name)
+        return None, True
+
+    def fetch_releases(self, updater, package_name):
+        package_name = canonicalize_name(package_name)
+        index = self.get_route(package_name)
+        if index is not None:
+            self._sources[package_name] = index
+            return index.fetch_releases(updater, package_name)
+        indexes = [
+            index
+            for index in self.indexes
+            if self.negative_cache is None
+            or not self.negative_cache.contains(getattr(index, "index_url", index.name), package_name)
+        ]
+        if not indexes:
+            return None
+        futures = [self._executor.submit(self._fetch_releases, updater, index, package_name) for index in indexes[1:]]
+        # the highest-priority index is queried on this thread, so its requests are recorded in the package's stats
+        results = itertools.chain(
+            [self._fetch_releases(updater, indexes[0], package_name)],
+            (future.result() for future in futures),
+        )
+        for index, (releases, missing) in zip(indexes, results, strict=True):
+            if releases is not None:
+                self._sources[package_name] = index
+                return releases
+            if not missing:
+                # a lower-priority index mustn't answer while a higher-priority one may have the package
+                logger.debug(f"{index.name} didn't answer for {package_name}, not trying lower-priority indexes")
+                return None
+        return None
+
+    def _source(self, package_name):
+        return self._sources.get(canonicalize_name(package_name), self.indexes[0])
+
+    def metadata_urls(self, updater, package_name, version):
+        return self._source(package_name).metadata_urls(updater, package_name, version)
+
+    def hedge_url(self, url):
+        for index in self.indexes:
+            if url.startswith(f"{getattr(index, 'index_url', None)}/"):
+                return index.hedge_url(url)
+        return url
+
+
+class Stats:
+    """Timing and I/O measurements of a run.
+
+    Phase totals (load, validate, resolve, write) are summed across threads. Per-package measurements are recorded for
+    whichever package the current thread is resolving (see `package`). Callbacks registered with `subscribe` are called
+    with `(event, data)` for every `"phase"` and `"package"` measurement as soon as it completes.
+    """
+
+    def __init__(self):
+        self.phases = {}
+        self.packages = {}
+        self._callbacks = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def subscribe(self, callback):
+        self._callbacks.append(callback)
+
+    def _notify(self, event, data):
+        for callback in self._callbacks:
+            callback(event, data)
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.phases[name] = self.phases.get(name, 0.0) + elapsed
+            self._notify("phase", {"name": name, "seconds": elapsed})
+
+    @contextlib.contextmanager
+    def package(self, package_name):
+        """Attribute measurements made by this thread to `package_name` until the block exits."""
+        record = {
+            "requests": 0,
+            "bytes_received": 0,
+            "fetch_seconds": 0.0,
+            "decode_seconds": 0.0,
+            "select_seconds": 0.0,
+        }
+        self._local.record = record
+        try:
+            yield record
+        finally:
+            self._local.record = None
+            with self._lock:
+                self.packages[package_name] = record
+            self._notify("package", {"name": package_name, **record})
+
+    def add(self, **measurements):
+        record = getattr(self._local, "record", None)
+        if record is not None:
+            for key, value in measurements.items():
+                record[key] = record.get(key, 0) + value
+
+    def set(self, **measurements):
+        record = getattr(self._local, "record", None)
+        if record is not None:
+            record.update(measurements)
+
+    @contextlib.contextmanager
+    def timer(self, key):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(**{key: time.perf_counter() - start})
+
+    def to_dict(self):
+        return {"phases": dict(self.phases), "packages": dict(self.packages)}
+
+    def format_summary(self, limit=10):
+        lines = ["timings:"]
+        lines.extend(f"- {name}: {seconds:.3f}s" for name, seconds in self.phases.items())
+
+        def total(item):
+            _, record = item
+            return record["fetch_seconds"] + record["decode_seconds"] + record["select_seconds"]
+
+        slowest = sorted(self.packages.items(), key=total, reverse=True)[:limit]
+        if slowest:
+            lines.append("slowest packages (fetch/decode/select):")
+            for name, record in slowest:
+                lines.append(
+                    f"- {name}: {record['fetch_seconds']:.3f}s/{record['decode_seconds']:.3f}s/"
+                    f"{record['select_seconds']:.3f}s, {record['requests']} requests, "
+                    f"{record['bytes_received']} bytes, status {record.get('status')}, cache {record.get('cache')}"
+                )
+        return "\n".join(lines)
+
+
+class NegativeCache:
+    """Persistent record of packages an index answered 404 for, so they aren't looked up there again.
+
+    Entries expire after `ttl` seconds, so packages published in the meantime are found, or never if `ttl` is None.
+    """
+
+    def __init__(self, cache_dir=None, ttl=DEFAULT_NEGATIVE_CACHE_TTL):
+        base_dir = cache_dir if cache_dir is not None else default_cache_dir()
+        self.cache_dir = os.path.join(base_dir, "missing")
+        self.ttl = ttl
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _path(self, index_url, package_name):
+        digest = hashlib.sha256(f"{index_url}\0{canonicalize_name(package_name)}".encode()).hexdigest()
+        return os.path.join(self.cache_dir, digest)
+
+    def contains(self, index_url, package_name):
+        try:
+            stored_at = os.stat(self._path(index_url, package_name)).st_mtime
+        except FileNotFoundError:
+            return False
+        return self.ttl is None or time.time() - stored_at < self.ttl
+
+    def add(self, index_url, package_name):
+        with open(self._path(index_url, package_name), "w"):
+            pass
+
+
+class LatencyTracker:
+    """Latencies of recent requests, used to adapt request timeouts and decide when to send hedged requests.
+
+    Until `min_samples` latencies were recorded, there are no percentiles and the fixed `REQUEST_TIMEOUT` is used.
+    """
+
+    def __init__(self, size=256, min_samples=20):
+        self.min_samples = min_samples
+        self._samples = collections.deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, fraction):
+        """Return the latency below which `fraction` of recent requests completed, or None without enough samples."""
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            samples = sorted(self._samples)
+        return samples[min(len(samples) - 1, int(fraction * len(samples)))]
+
+    def timeout(self):
+        """Return a request timeout of a few times the 99th percentile latency, within fixed bounds."""
+        p99 = self.percentile(0.99)
+        if p99 is None:
+            return REQUEST_TIMEOUT
+        return min(REQUEST_TIMEOUT, max(MIN_REQUEST_TIMEOUT, p99 * TIMEOUT_LATENCY_FACTOR))
+
+    def hedge_delay(self):
+        """Return how long to wait for a response before sending a hedged request (the 95th percentile latency)."""
+        p95 = self.percentile(0.95)
+        return None if p95 is None else max(MIN_HEDGE_DELAY, p95)
+
+
+class ValidationCache:
+    """Persistent record of pyproject.toml contents that already passed validation, keyed by content hash."""
+
+    def __init__(self, cache_dir=None):
+        base_dir = cache_dir if cache_dir is not None else default_cache_dir()
+        self.cache_dir = os.path.join(base_dir, "validated")
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _path(self, digest):
+        return os.path.join(self.cache_dir, digest)
+
+    def __contains__(self, digest):
+        return os.path.exists(self._path(digest))
+
+    def add(self, digest):
+        with open(self._path(digest), "w"):
+            pass
+
+
+class StateFile:
+    """Versions resolved by previous runs, and the index changelog serial they were resolved at.
+
+    Before resolving, `sync` asks the index which packages changed since the recorded serial and returns the recorded
+    versions of every other package, so only changed packages are fetched again. Recorded versions
+    are discarded when the index changes or has no changelog.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.synced = False
+        self._dirty = False
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            data = {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"ignoring unreadable state file: {e}")
+            data = {}
+        self.index_url = data.get("index")
+        self.serial = data.get("serial")
+        self.packages = data.get("packages", {})
+
+    def sync(self, updater):
+        """Return `{(package name, requires-python specifier): version}` for packages unchanged since the last run.
+
+        Only the first call per run queries the index, later calls return an empty map.
+        """
+        if self.synced:
+            return {}
+        self.synced = True
+        index_url = getattr(updater.index, "index_url", None)
+        # read the serial before fetching anything, so packages changed during this run are fetched again next run
+        serial = updater.index.last_serial(updater)
+        changed = None
+        if serial is not None and self.serial is not None and index_url == self.index_url:
+            changed = updater.index.changed_since(updater, self.serial, serial)
+            if changed is None:
+                logger.info(f"can't read the index changelog since serial {self.serial}, looking up every package")
+        if changed is None:
+            self.packages = {}
+        else:
+            for package_name in changed:
+                self.packages.pop(package_name, None)
+            logger.info(f"reusing {len(self.packages)} packages unchanged since serial {self.serial}")
+        self.index_url = index_url
+        self.serial = serial
+        self._dirty = True
+        return {
+            (package_name, requires_python_spec): version
+            for package_name, versions in self.packages.items()
+            for requires_python_spec, version in versions.items()
+        }
+
+    def record(self, resolved_versions):
+        """Record resolved versions. Packages that couldn't be resolved are fetched again next run."""
+        for (package_name, requires_python_spec), version in resolved_versions.items():
+            versions = self.packages.setdefault(package_name, {})
+            if version is not None and versions.get(requires_python_spec) != version:
+                versions[requires_python_spec] = version
+                self._dirty = True
+
+    def save(self):
+        if not self._dirty:
+            return
+        data = {"index": self.index_url, "serial": self.serial, "packages": self.packages}
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.path)), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(data, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        self._dirty = False
+
+
+def write_pyproject_text(pyproject_toml_path, text):
+    """Write pyproject.toml atomically, so it is never left half written, keeping its permissions."""
+    directory = os.path.dirname(os.path.abspath(pyproject_toml_path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".pyproject.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(text)
+        with contextlib.suppress(OSError):
+            os.chmod(tmp_path, os.stat(pyproject_toml_path).st_mode)
+        os.replace(tmp_path, pyproject_toml_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+# deadline and timeout of the request being sent on each thread, for the session's retry policy
+_request_deadline = threading.local()
+
+
 class Updater:
-    def __init__(self, pyproject_toml_path=None):
+    def __init__(
+        self,
+        pyproject_toml_path=None,
+        jobs=DEFAULT_JOBS,
+        http_cache=None,
+        validate=True,
+        validation_cache=None,
+        index=None,
+        stats=None,
+        state=None,
+        keep_releases=False,
+        check_conflicts=None,
+        hedge=True,
+        deadline=None,
+    ):
+        if jobs < 1:
+            raise ValueError(f"number of jobs must be at least 1: {jobs}")
         self.pyproject_toml_path = pyproject_toml_path
-        self.pyproject_data = self.load() if pyproject_toml_path is not None else None
+        self.jobs = jobs
+        self.http_cache = http_cache
+        self.validate = validate
+        self.validation_cache = validation_cache
+        self.index = index if index is not None else SimpleIndex()
+        self.stats = stats if stats is not None else Stats()
+        self.state = state
+        self._session = None
         self._requires_python_spec = None
-        self._dry_run = True
+        self._resolved_versions = {}
+        self._releases = {} if keep_releases else None
+        self._requires_dist = {}
+        self.check_conflicts = check_conflicts
+        self.latency = LatencyTracker()
+        self._hedge_executor = _DaemonThreadPoolExecutor(max_workers=2 * jobs) if hedge else None
+        self.deadline = deadline
+        self._deadline_at = None
+        self.deadline_skipped = set()
+        self._unavailable = set()
+        self._fetch_error = threading.local()
+        self.edits = []
+        self.pyproject_data = self.load() if pyproject_toml_path is not None else None
+
+    @property
+    def session(self):
+        if self._session is None:
+            self._session = self._create_session()
+        return self._session
+
+    @session.setter
+    def session(self, value):
+        self._session = value
 
     @property
     def requires_python_spec(self):
@@ -54,35 +1416,15 @@ class Updater:
         try:
             return self.pyproject_data["project"]["requires-python"]
         except KeyError:
-            raise KeyError("could not find 'project.requires-python' in pyproject.toml")
+            raise PyprojectError("could not find 'project.requires-python' in pyproject.toml") from None
 
     @requires_python_spec.setter
     def requires_python_spec(self, value):
         self._requires_python_spec = value
 
     def get_dependency_name_and_operator(self, dependency_specifier):
-        illegal_chars = ("/", ":", "@")
-        if any(char in dependency_specifier for char in illegal_chars):
-            raise ValueError(f"can't handle direct reference dependency specifier: '{dependency_specifier}'")
-        try:
-            list(requirements.parse(dependency_specifier))
-        except InvalidRequirement:
-            raise ValueError(f"skipping invalid dependency specifier: '{dependency_specifier}'")
-        if ";" in dependency_specifier:
-            dependency_specifier = dependency_specifier.split(";")[0]
-        invalid_operators = ("!=", "<=", "<")
-        for op in invalid_operators:
-            if op in dependency_specifier:
-                raise ValueError(f"skipping unsupported version identifier: '{op}'")
-        valid_operators = ("===", "==", "~=", ">=", ">")
-        operators = re.findall("|".join(valid_operators), dependency_specifier)
-        if not operators:
-            raise ValueError(f"no version specified: '{dependency_specifier}'")
-        if len(operators) != 1:
-            raise ValueError(f"can't handle complex dependency specifier: '{dependency_specifier}'")
-        operator = operators[0]
-        dependency_name = dependency_specifier.replace(" ", "").split(operator)[0].strip()
-        return dependency_name, operator
+        parsed = parse_dependency_specifier(dependency_specifier)
+        return parsed.dependency_name, parsed.operator
 
     def get_dependencies_groups(self):
         """Map each dependency group name to a list of dependency specifiers.
@@ -93,6 +1435,10 @@ class Updater:
             - dependency lists from `[dependency-groups]` section
         """
         data = self.pyproject_data
+        if "project" not in data:
+            raise PyprojectError("could not find '[project]' in pyproject.toml")
+        if not isinstance(data["project"], Mapping):
+            raise PyprojectError("'project' in pyproject.toml is not a table")
         groups = {}
         project_dependencies = list(data["project"].get("dependencies", []))
         if project_dependencies:
@@ -104,219 +1450,1393 @@ class Updater:
         if dependency_groups:
             groups.update({"dependency-groups": dependency_groups})
         if not groups:
-            raise ValueError("no dependencies found")
+            raise PyprojectError("no dependencies found")
         return groups
 
     def update_dependency(self, dependency_specifier):
-        dependency_name, operator = self.get_dependency_name_and_operator(dependency_specifier)
-        new_dependency_version = self.fetch_new_package_version(self.get_package_base_name(dependency_name))
-        updated_dependency_specifier = None
-        if new_dependency_version is not None:
-            if ";" in dependency_specifier:
-                after_semi = "".join(dependency_specifier.split(";")[1:])
-                updated_dependency_specifier = f"{dependency_name}{operator}{new_dependency_version};{after_semi}"
-            else:
-                updated_dependency_specifier = f"{dependency_name}{operator}{new_dependency_version}"
-        return updated_dependency_specifier
+        """Return the specifier with its version replaced by the new version, or None if it can't be resolved.
 
-    def update_dependencies(self, dependency_specifiers):
-        updated_dependency_specifiers = []
-        for dependency_specifier in dependency_specifiers:
-            if isinstance(dependency_specifier, tomlkit.items.InlineTable):
+        Only the version is replaced, so whitespace, extras and markers are kept exactly as written.
+        """
+        parsed = parse_dependency_specifier(dependency_specifier)
+        new_dependency_version = self.resolve_package_version(parsed.name)
+        if new_dependency_version is None:
+            return None
+        return parsed.with_version(new_dependency_version)
+
+    def is_deadline_skipped(self, dependency_specifier):
+        """Check if the package of a specifier wasn't resolved because the deadline passed."""
+        return canonicalize_name(parse_dependency_specifier(dependency_specifier).name) in self.deadline_skipped
+
+    def get_dependency_edits(self, group, dependency_specifiers):
+        """Return an `Edit` for every specifier in a dependency array that has a new version, logging each decision."""
+        from tomlkit.items import InlineTable
+
+        edits = []
+        for index, dependency_specifier in enumerate(dependency_specifiers):
+            if isinstance(dependency_specifier, InlineTable):
                 logger.info(f"- skipping inline table: '{dependency_specifier}'")
-                updated_dependency_specifiers.append(dependency_specifier)
                 continue
             try:
-                self.get_dependency_name_and_operator(dependency_specifier)
+                parse_dependency_specifier(dependency_specifier)
             except ValueError as e:
                 logger.info(f"- not updating: '{dependency_specifier}' ({e})")
-                updated_dependency_specifiers.append(dependency_specifier)
                 continue
             updated_dependency_specifier = self.update_dependency(dependency_specifier)
-            if updated_dependency_specifier is not None:
-                if dependency_specifier != updated_dependency_specifier:
-                    logger.info(f"- updating: '{dependency_specifier}' to '{updated_dependency_specifier}'")
-                    updated_dependency_specifiers.append(updated_dependency_specifier)
-                else:
-                    logger.info(f"- not updating: '{dependency_specifier}' (no new version available)")
-                    updated_dependency_specifiers.append(dependency_specifier)
+            if updated_dependency_specifier is None and self.is_deadline_skipped(dependency_specifier):
+                logger.info(f"- not updating: '{dependency_specifier}' (skipped, deadline exceeded)")
+            elif updated_dependency_specifier is None:
+                logger.info(
+                    f"- not updating: '{dependency_specifier}' (error retrieving version from {self.index.name})"
+                )
+            elif dependency_specifier != updated_dependency_specifier:
+                logger.info(f"- updating: '{dependency_specifier}' to '{updated_dependency_specifier}'")
+                edits.append(Edit(group, index, str(dependency_specifier), updated_dependency_specifier))
             else:
-                logger.info(f"- not updating: '{dependency_specifier}' (error retrieving version from pypi.org)")
-                updated_dependency_specifiers.append(dependency_specifier)
+                logger.info(f"- not updating: '{dependency_specifier}' (no new version available)")
+        return edits
+
+    def update_dependencies(self, dependency_specifiers):
+        """Return a copy of a dependency array with every specifier that has a new version updated."""
+        updated_dependency_specifiers = list(dependency_specifiers)
+        for edit in self.get_dependency_edits(None, dependency_specifiers):
+            updated_dependency_specifiers[edit.index] = edit.new
         return updated_dependency_specifiers
 
+    def get_updatable_package_names(self, dependency_specifiers):
+        from tomlkit.items import InlineTable
+
+        package_names = []
+        for dependency_specifier in dependency_specifiers:
+            if isinstance(dependency_specifier, InlineTable):
+                continue
+            try:
+                package_names.append(parse_dependency_specifier(dependency_specifier).name)
+            except ValueError:
+                continue
+        return package_names
+
+    def get_all_dependency_specifiers(self):
+        all_dependency_specifiers = []
+        for key, project_dependencies in self.get_dependencies_groups().items():
+            if key == "project":
+                all_dependency_specifiers.extend(project_dependencies)
+            else:
+                for dep_list in project_dependencies.values():
+                    all_dependency_specifiers.extend(dep_list)
+        return all_dependency_specifiers
+
+    def resolve_package_version(self, package_name):
+        """Fetch the new version of a package, at most once per run.
+
+        Results are memoized by normalized package name (PEP 503) and requires-python specifier, including packages
+        that couldn't be resolved.
+        """
+        key = (canonicalize_name(package_name), self.requires_python_spec)
+        if key not in self._resolved_versions:
+            self._resolved_versions[key] = self.fetch_new_package_version(*key)
+        return self._resolved_versions[key]
+
+    def resolve_package_versions(self, package_names):
+        """Fetch new versions for all packages concurrently, using up to `jobs` worker threads.
+
+        Each distinct normalized package name is fetched once. Results are stored so subsequent calls to
+        `update_dependency` don't hit pypi.org again.
+        """
+        requires_python_spec = self.requires_python_spec
+        self.resolve_pairs((package_name, requires_python_spec) for package_name in package_names)
+
+    def resolve_pairs(self, pairs):
+        """Fetch new versions for `(package name, requires-python specifier)` pairs concurrently.
+
+        Each distinct package is fetched once, and its new version is selected once for every distinct
+        requires-python specifier it is paired with. With a state file, packages unchanged since the previous run
+        aren't fetched at all.
+        """
+        for _ in self.iter_resolve_pairs(pairs):
+            pass
+
+    def iter_resolve_pairs(self, pairs):
+        """Resolve pairs like `resolve_pairs`, yielding each package as soon as it is resolved.
+
+        Yields `(normalized package name, {requires-python specifier: new version}, seconds spent resolving)`.
+        Packages that were already resolved are yielded first, with 0 seconds.
+
+        With a `deadline`, its budget starts now, and packages still resolving when it runs out are skipped. Requests
+        made after resolving, like conflict checks, share what is left of the budget.
+        """
+        if self.deadline is not None:
+            self._deadline_at = time.monotonic() + self.deadline
+        if self.state is not None:
+            for key, version in self.state.sync(self).items():
+                self._resolved_versions.setdefault(key, version)
+        wanted = {}
+        pending = {}
+        for package_name, requires_python_spec in pairs:
+            key = (canonicalize_name(package_name), requires_python_spec)
+            wanted.setdefault(key[0], {})[requires_python_spec] = None
+            if key not in self._resolved_versions:
+                pending.setdefault(key[0], {})[requires_python_spec] = None
+
+        def resolved(package_name):
+            return {spec: self._resolved_versions[(package_name, spec)] for spec in wanted[package_name]}
+
+        def skip(package_names):
+            for package_name in package_names:
+                logger.debug(f"deadline exceeded, skipping {package_name}")
+                self.deadline_skipped.add(package_name)
+                for requires_python_spec in pending[package_name]:
+                    self._resolved_versions[(package_name, requires_python_spec)] = None
+                yield package_name, resolved(package_name), None
+
+        for package_name in wanted:
+            if package_name not in pending:
+                yield package_name, resolved(package_name), 0.0
+        if pending and self.deadline_exceeded():
+            yield from skip(list(pending))
+        elif pending:
+            self.session  # noqa: B018 create the session before it is shared between threads
+            # with a deadline, packages still resolving are abandoned, and exiting mustn't wait for them
+            executor_class = ThreadPoolExecutor if self.deadline is None else _DaemonThreadPoolExecutor
+            executor = executor_class(max_workers=min(self.jobs, len(pending)))
+            futures = {
+                executor.submit(self._timed_fetch_new_package_versions, package_name, list(specs)): package_name
+                for package_name, specs in pending.items()
+            }
+            try:
+                for future in as_completed(futures, timeout=self.remaining_time()):
+                    package_name = futures.pop(future)
+                    new_versions, seconds = future.result()
+                    for requires_python_spec, new_version in zip(pending[package_name], new_versions, strict=True):
+                        self._resolved_versions[(package_name, requires_python_spec)] = new_version
+                    yield package_name, resolved(package_name), seconds
+            except FutureTimeoutError:
+                # don't wait for packages still resolving when the deadline passes
+                yield from skip(list(futures.values()))
+            finally:
+                executor.shutdown(wait=False, cancel_futures=True)
+        if self.state is not None:
+            self.state.record(
+                {
+                    key: version
+                    for key, version in self._resolved_versions.items()
+                    if key[0] not in self.deadline_skipped
+                }
+            )
+            self.state.save()
+
+    def _timed_fetch_new_package_versions(self, package_name, requires_python_specs):
+        start = time.perf_counter()
+        new_versions = self._fetch_new_package_versions(package_name, requires_python_specs)
+        return new_versions, time.perf_counter() - start
+
+    def resolve_many(self, package_names, requires_python=None):
+        """Resolve the newest stable release of many packages concurrently, returning a `Resolution` per name.
+
+        Results are in the order of `package_names`. `requires_python` defaults to the one in pyproject.toml, or to
+        any Python without a pyproject.toml. Nothing is logged, and errors raise `BumpDependenciesError` subclasses
+        instead of exiting.
+
+        The session, HTTP cache and resolved versions are kept between calls, so one long-lived Updater answers
+        repeated lookups at warm-cache speed. Call `forget_resolved` to look packages up again.
+        """
+        if requires_python is None:
+            requires_python = self.requires_python_spec if self.pyproject_data is not None else ""
+        _check_requires_python(requires_python)
+        package_names = list(package_names)
+        pairs = [(package_name, requires_python) for package_name in package_names]
+        seconds = {package_name: elapsed for package_name, _, elapsed in self.iter_resolve_pairs(pairs)}
+        resolutions = []
+        for package_name in map(canonicalize_name, package_names):
+            version = self._resolved_versions[(package_name, requires_python)]
+            reason = self._unresolved_reason(package_name) if version is None else None
+            resolutions.append(Resolution(package_name, version, reason, seconds[package_name]))
+        return resolutions
+
+    def _unresolved_reason(self, package_name):
+        if package_name in self.deadline_skipped:
+            return "skipped, deadline exceeded"
+        if package_name in self._unavailable:
+            return f"error retrieving versions from {self.index.name}"
+        return "no compatible stable release"
+
+    def resolve_matrix(self, package_names, python_versions):
+        """Return `{normalized package name: {python version: new version or None}}` for target Python minor versions.
+
+        The releases of each package are fetched once and walked once for all targets.
+        """
+        normalized_names = list(dict.fromkeys(canonicalize_name(package_name) for package_name in package_names))
+        specs = {python_version: python_version_spec(python_version) for python_version in python_versions}
+        self.resolve_pairs((package_name, spec) for package_name in normalized_names for spec in specs.values())
+        return {
+            package_name: {
+                python_version: self._resolved_versions[(package_name, spec)] for python_version, spec in specs.items()
+            }
+            for package_name in normalized_names
+        }
+
+    def _fetch_new_package_versions(self, package_name, requires_python_specs):
+        with self.stats.package(package_name):
+            all_releases = self.fetch_releases(package_name)
+            if all_releases is None:
+                self._unavailable.add(canonicalize_name(package_name))
+            with self.stats.timer("select_seconds"):
+                return self.select_new_package_versions(package_name, all_releases, requires_python_specs)
+
     def get_package_base_name(self, package_name):
         match = re.match(r"^(.*?)\[", package_name)
         if match:
             return match.group(1).strip()
         return package_name.strip()
 
-    def _extract_bounds(self, spec):
-        """Convert a SpecifierSet into inclusive lower/upper bounds.
+    def _is_compatible(self, requires_python, user_requires_python):
+        """Check if requires-python constraint overlaps with the user's constraint."""
+        if not requires_python:
+            return True
+        return requires_python_intersects(user_requires_python, requires_python)
 
-        Supports the common requires-python forms:
-            >=3.8
-            >3.8
-            <4
-            <=3.12
-            >=3.8,<4
+    def _iter_stable_versions_newest_first(self, releases):
+        """Yield `(version, version string, files)` for stable releases, newest first.
 
-        This is not fully PEP 440 correct. It handles the overwhelming majority of real-world requires-python values,
-        but it does not correctly model exclusions such as: >=3.8,<4,!=3.9.*
+        Versions are kept in a heap rather than fully sorted, since the newest one or two are usually all that's needed.
+        A `ReleaseIndex` is already sorted, so its versions are only parsed as they are yielded.
         """
-        min_ver = None
-        max_ver = None
-        for s in spec:
-            if s.operator == "!=":
-                continue
-            if "*" in s.version:
+        if isinstance(releases, ReleaseIndex):
+            for ver_str, files in releases.iter_stable_newest_first():
+                yield Version(ver_str), ver_str, files
+            return
+        heap = []
+        for ver_str in releases:
+            try:
+                ver = Version(ver_str)
+            except InvalidVersion:
                 continue
-            v = Version(s.version)
-            if s.operator in (">=", ">"):
-                min_ver = v if min_ver is None else max(min_ver, v)
-            elif s.operator in ("<=", "<"):
-                max_ver = v if max_ver is None else min(max_ver, v)
-            elif s.operator == "==":
-                min_ver = v
-                max_ver = v
-        return min_ver, max_ver
-
-    def _intersects(self, spec_a, spec_b):
-        """Check if if the two SpecifierSets have any possible overlap."""
-        a_min, a_max = self._extract_bounds(spec_a)
-        b_min, b_max = self._extract_bounds(spec_b)
-        lower = max(
-            (v for v in (a_min, b_min) if v is not None),
-            default=None,
-        )
-        upper = min(
-            (v for v in (a_max, b_max) if v is not None),
-            default=None,
+            if not ver.is_prerelease:
+                heap.append((_newest_first(ver), ver_str))
+        heapq.heapify(heap)
+        while heap:
+            key, ver_str = heapq.heappop(heap)
+            yield key.obj, ver_str, releases[ver_str]
+
+    def _create_session(self):
+        """Create a keep-alive HTTP session with a connection pool sized for `jobs` concurrent lookups.
+
+        With hedging, the pool is twice as large, since each lookup may have a hedged duplicate in flight.
+
+        Transient failures (connection errors, 429, 5xx) are retried with exponential backoff and jitter, honoring
+        any `Retry-After` header sent by the server. With a deadline, a request isn't retried if waiting and sending
+        it again could run past the deadline.
+        """
+        import requests
+        from requests.adapters import HTTPAdapter, Retry
+        from urllib3.exceptions import MaxRetryError, ResponseError
+
+        class DeadlineRetry(Retry):
+            def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+                retry = super().increment(method, url, response, error, _pool, _stacktrace)
+                deadline_at = getattr(_request_deadline, "at", None)
+                if deadline_at is not None:
+                    wait = retry.get_backoff_time()
+                    if response is not None and retry.respect_retry_after_header:
+                        wait = max(wait, retry.get_retry_after(response) or 0)
+                    if time.monotonic() + wait + _request_deadline.timeout > deadline_at:
+                        raise MaxRetryError(_pool, url, error or ResponseError("deadline exceeded"))
+                return retry
+
+        retry = DeadlineRetry(
+            total=DEFAULT_RETRIES,
+            backoff_factor=0.5,
+            backoff_jitter=0.5,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=("GET",),
+            respect_retry_after_header=True,
+            raise_on_status=False,
         )
-        return lower is None or upper is None or lower <= upper
+        pool_size = self.jobs if self._hedge_executor is None else 2 * self.jobs
+        adapter = HTTPAdapter(pool_maxsize=pool_size, max_retries=retry)
+        session = requests.Session()
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
 
-    def _is_compatible(self, requires_python, user_spec):
-        """Check if requires-python constraint overlaps with the user's constraint."""
-        if not requires_python:
-            return True
-        pkg_spec = SpecifierSet(requires_python)
-        return self._intersects(user_spec, pkg_spec)
+    def fetch(self, url, accept=None, revalidate=False):
+        """Fetch a document as `(content_type, content)`, going through the HTTP cache if one is configured.
+
+        With `revalidate`, a cached response is revalidated even if it is fresh. Returns None if the server responds
+        with an HTTP error, or can't be reached after retrying.
+        """
+        import requests
 
-    def _is_valid_stable_version(self, version):
+        self._fetch_error.status = None
+        self._fetch_error.url = url
+        if self.deadline_exceeded():
+            self._fetch_error.status = "deadline exceeded"
+            return None
+        cached = self.http_cache.get(url) if self.http_cache is not None else None
+        headers = {"Accept": accept} if accept is not None else {}
+        if cached is not None:
+            meta, body = cached
+            if not revalidate and self.http_cache.is_fresh(meta):
+                self.stats.set(cache="hit")
+                return meta.get("content_type", ""), body
+            headers.update(self.http_cache.conditional_headers(meta))
+        start = time.perf_counter()
         try:
-            return not Version(version).is_prerelease
-        except InvalidVersion:
-            return False
+            response = self._get(url, headers)
+            response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            status = e.response.status_code if e.response is not None else type(e).__name__
+            self.stats.add(requests=1, fetch_seconds=time.perf_counter() - start)
+            self.stats.set(status=status)
+            self._fetch_error.status = status
+            return None
+        self.stats.add(requests=1, fetch_seconds=time.perf_counter() - start, bytes_received=len(response.content))
+        self.stats.set(status=response.status_code, cache="miss" if self.http_cache is not None else None)
+        if cached is not None and response.status_code == 304:
+            self.stats.set(cache="revalidated")
+            self.http_cache.refresh(url, meta)
+            return meta.get("content_type", ""), body
+        if self.http_cache is not None:
+            self.http_cache.store(url, response)
+        return response.headers.get("Content-Type", ""), response.content
 
-    def _remove_invalid_versions(self, releases):
-        return {
-            version: asset_meta for version, asset_meta in releases.items() if self._is_valid_stable_version(version)
-        }
+    def last_fetch_error(self, url=None):
+        """Return the HTTP status (or exception name) of this thread's last `fetch`, or None if it succeeded.
+
+        With a `url`, None is also returned if the last `fetch` was of another URL.
+        """
+        if url is not None and getattr(self._fetch_error, "url", None) != url:
+            return None
+        return getattr(self._fetch_error, "status", None)
+
+    def get_cached_releases(self, url):
+        """Return the releases of a fresh HTTP cache entry from its `ReleaseIndex`, without reading the cached body.
+
+        Returns None if there is no HTTP cache, or no fresh entry with a release index for `url`.
+        """
+        if self.http_cache is None:
+            return None
+        with self.stats.timer("decode_seconds"):
+            releases = self.http_cache.get_fresh_releases(url)
+        if releases is not None:
+            self._fetch_error.status = None
+            self.stats.set(cache="hit")
+        return releases
+
+    def load_releases(self, url, content, decode):
+        """Decode the releases of a fetched document with `decode`.
 
-    def fetch_new_package_version(self, package_name):
-        url = f"https://pypi.org/pypi/{package_name}/json"
+        With an HTTP cache, decoded releases are also stored as a compact `ReleaseIndex`, which is loaded instead of
+        decoding again for as long as the document doesn't change.
+        """
+        if self.http_cache is None:
+            with self.stats.timer("decode_seconds"):
+                return decode(content)
+        digest = hashlib.sha256(content).digest()
+        with self.stats.timer("decode_seconds"):
+            releases = self.http_cache.get_releases(url, digest)
+            if releases is not None:
+                return releases
+            releases = decode(content)
+        self.http_cache.store_releases(url, digest, releases)
+        return releases
+
+    def remaining_time(self):
+        """Return the seconds left of the current run's deadline budget, or None without a deadline."""
+        if self._deadline_at is None:
+            return None
+        return self._deadline_at - time.monotonic()
+
+    def deadline_exceeded(self):
+        """Check if the current run's deadline budget has run out."""
+        remaining = self.remaining_time()
+        return remaining is not None and remaining <= 0
+
+    def request_timeout(self, timeout=None):
+        """Return `timeout`, or the adaptive request timeout, cut short so requests don't outlive the deadline."""
+        if timeout is None:
+            timeout = self.latency.timeout()
+        remaining = self.remaining_time()
+        if remaining is not None:
+            timeout = max(0.1, min(timeout, remaining))
+        return timeout
+
+    def _timed_get(self, url, headers, timeout):
+        import requests
+
+        # read by the session's retry policy, which runs on this thread
+        _request_deadline.at = self._deadline_at
+        _request_deadline.timeout = timeout
+        start = time.perf_counter()
         try:
-            response = requests.get(url, timeout=10)
-            response.raise_for_status()
-        except requests.exceptions.ConnectionError:
-            sys.exit("error connecting to pypi.org")
-        except requests.exceptions.HTTPError:
+            response = self.session.get(url, headers=headers, timeout=timeout)
+        except requests.exceptions.RequestException:
+            # a timed-out request took at least the timeout, so timeouts grow again when the index slows down
+            elapsed = time.perf_counter() - start
+            if elapsed >= timeout:
+                self.latency.add(elapsed)
+            raise
+        self.latency.add(time.perf_counter() - start)
+        return response
+
+    def _get(self, url, headers):
+        """Send a GET request with an adaptive timeout, hedging it if no response arrives within the usual latency.
+
+        A hedged request is a duplicate sent to the index's mirror (or the same URL) once the first request is slower
+        than the 95th percentile latency. Whichever answers first without a server error is used.
+        """
+        timeout = self.request_timeout()
+        hedge_delay = self.latency.hedge_delay() if self._hedge_executor is not None else None
+        if hedge_delay is None or hedge_delay >= timeout:
+            return self._timed_get(url, headers, timeout)
+        primary = self._hedge_executor.submit(self._timed_get, url, headers, timeout)
+        with contextlib.suppress(FutureTimeoutError):
+            return primary.result(timeout=hedge_delay)
+        self.stats.add(hedged_requests=1)
+        hedged = self._hedge_executor.submit(self._timed_get, self.index.hedge_url(url), headers, timeout)
+        for future in as_completed((primary, hedged)):
+            if future.exception() is None and future.result().status_code < 500:
+                break
+        return future.result()
+
+    def call_xmlrpc(self, url, method, *params):
+        """Call an XML-RPC method, like the pypi.org changelog API.
+
+        Returns None if the server responds with an HTTP error or a fault, or can't be reached after retrying.
+        """
+        import xmlrpc.client
+        from xml.parsers.expat import ExpatError
+
+        import requests
+
+        if self.deadline_exceeded():
             return None
-        data = response.json()
-        requires_python_spec = self.requires_python_spec
         try:
-            user_spec = SpecifierSet(requires_python_spec)
-        except Exception as e:
-            sys.exit(f"invalid requires-python specifier '{requires_python_spec}': {e}")
-        releases = self._remove_invalid_versions(data.get("releases", {}))
-        for ver_str in sorted(releases, key=Version, reverse=True):
-            ver = Version(ver_str)
-            files = data["releases"].get(ver_str, [])
+            response = self.session.post(
+                url,
+                data=xmlrpc.client.dumps(params, method),
+                headers={"Content-Type": "text/xml"},
+                timeout=self.request_timeout(REQUEST_TIMEOUT),
+            )
+            response.raise_for_status()
+            (result,), _ = xmlrpc.client.loads(response.content)
+        except (requests.exceptions.RequestException, xmlrpc.client.Error, ExpatError):
+            return None
+        return result
+
+    def fetch_releases(self, package_name):
+        """Map each release version of a package to a list of file info dicts, or None if it can't be found.
+
+        With `keep_releases`, parsed releases are kept in memory and shared by copies of this Updater.
+        """
+        if self._releases is None:
+            return self.index.fetch_releases(self, package_name)
+        key = canonicalize_name(package_name)
+        releases = self._releases.get(key)
+        if releases is None:
+            releases = self.index.fetch_releases(self, package_name)
+            if releases is not None:
+                self._releases[key] = releases
+        return releases
+
+    def fetch_requires_dist(self, package_name, version):
+        """Return the `Requires-Dist` requirements of a release, or None if the index has no metadata file for it.
+
+        Only the PEP 658 metadata file (a few KB) of one of the release's files is fetched, never a distribution.
+        Results are kept for the rest of the run.
+        """
+        from email.parser import BytesHeaderParser
+
+        from packaging.requirements import InvalidRequirement, Requirement
+
+        key = (canonicalize_name(package_name), version)
+        if key in self._requires_dist:
+            return self._requires_dist[key]
+        requirements = None
+        for url in self.index.metadata_urls(self, key[0], version):
+            result = self.fetch(url)
+            if result is None:
+                continue
+            requirements = []
+            for value in BytesHeaderParser().parsebytes(result[1]).get_all("Requires-Dist") or []:
+                with contextlib.suppress(InvalidRequirement):
+                    requirements.append(Requirement(value))
+            break
+        self._requires_dist[key] = requirements
+        return requirements
+
+    def forget_resolved(self):
+        """Drop resolved versions and kept releases, so every package is looked up again."""
+        self._resolved_versions = {}
+        self._unavailable = set()
+        self.deadline_skipped = set()
+        if self._releases is not None:
+            self._releases = {}
+
+    def fetch_new_package_version(self, package_name, requires_python_spec=None):
+        if requires_python_spec is None:
+            requires_python_spec = self.requires_python_spec
+        return self._fetch_new_package_versions(package_name, [requires_python_spec])[0]
+
+    def select_new_package_version(self, package_name, all_releases, requires_python_spec):
+        """Find the newest stable release compatible with `requires_python_spec`, or None."""
+        return self.select_new_package_versions(package_name, all_releases, [requires_python_spec])[0]
+
+    def select_new_package_versions(self, package_name, all_releases, requires_python_specs):
+        """Find the newest stable release compatible with each requires-python specifier, in one walk over releases.
+
+        Returns a list with a version (or None) for each of `requires_python_specs`, in the same order.
+        """
+        new_versions = [None] * len(requires_python_specs)
+        if all_releases is None:
+            return new_versions
+        for requires_python_spec in requires_python_specs:
+            _check_requires_python(requires_python_spec)
+        pending = list(range(len(requires_python_specs)))
+        for ver, _, release_files in self._iter_stable_versions_newest_first(all_releases):
+            files = [file_info for file_info in release_files if not file_info.get("yanked")]
             if not files:
                 continue
-            compatible = False
-            for file_info in files:
-                release_requires = file_info.get("requires_python")
-                if not release_requires:
-                    compatible = True
-                    break
-                try:
-                    SpecifierSet(release_requires)
-                except Exception as e:
-                    sys.exit(f"invalid requires-python specifier in {package_name} {ver}: '{release_requires}': {e}")
-                if self._is_compatible(release_requires, user_spec):
-                    compatible = True
-                    break
-            if compatible:
-                return str(ver)
-        return None
+            release_requires = {file_info.get("requires_python") for file_info in files}
+            for i in pending:
+                if self._is_release_compatible(package_name, ver, release_requires, requires_python_specs[i]):
+                    new_versions[i] = str(ver)
+            pending = [i for i in pending if new_versions[i] is None]
+            if not pending:
+                break
+        return new_versions
+
+    def _is_release_compatible(self, package_name, ver, release_requires, requires_python_spec):
+        """Check if any file of a release, given the set of their requires-python values, supports the user's spec."""
+        requires_python = None
+        try:
+            for requires_python in release_requires:
+                if self._is_compatible(requires_python, requires_python_spec):
+                    return True
+        except Exception as e:
+            raise RequiresPythonError(
+                f"invalid requires-python specifier in {package_name} {ver}: '{requires_python}': {e}"
+            ) from e
+        return False
+
+    def read_pyproject(self):
+        import tomlkit
 
-    def load(self):
-        logger.info(f"loading: {self.pyproject_toml_path}")
         try:
             with open(self.pyproject_toml_path) as f:
-                pyproject_data = tomlkit.load(f)
+                return tomlkit.load(f)
         except FileNotFoundError:
-            exit("\nno pyproject.toml found")
+            raise PyprojectError("no pyproject.toml found") from None
         except Exception as e:
-            exit(f"\ninvalid pyproject.toml: {e}")
-        logger.info(f"validating: {os.path.basename(self.pyproject_toml_path)}\n")
+            raise PyprojectError(f"invalid pyproject.toml: {e}") from e
+
+    def _get_validation_digest(self, pyproject_data):
+        import tomlkit
+
+        content = tomlkit.dumps(pyproject_data).encode()
+        validator_version = importlib.metadata.version("validate-pyproject")
+        return hashlib.sha256(content + f"\0validate-pyproject=={validator_version}".encode()).hexdigest()
+
+    def validate_pyproject(self, pyproject_data):
+        """Validate pyproject.toml data, skipping the validator if identical content already passed validation."""
+        digest = None
+        if self.validation_cache is not None:
+            digest = self._get_validation_digest(pyproject_data)
+            if digest in self.validation_cache:
+                return
+        from validate_pyproject import api as validate_pyproject_api
+        from validate_pyproject.errors import ValidationError
+
         validator = validate_pyproject_api.Validator()
         try:
             validator(pyproject_data)
         except ValidationError as e:
-            exit(f"invalid pyproject.toml: {e.message}")
+            raise PyprojectError(f"invalid pyproject.toml: {e.message}") from e
+        if digest is not None:
+            self.validation_cache.add(digest)
+
+    def load(self):
+        logger.info(f"loading: {self.pyproject_toml_path}")
+        with self.stats.phase("load"):
+            pyproject_data = self.read_pyproject()
+        if self.validate:
+            logger.info(f"validating: {os.path.basename(self.pyproject_toml_path)}\n")
+            with self.stats.phase("validate"):
+                self.validate_pyproject(pyproject_data)
+        else:
+            logger.info("")
         return pyproject_data
 
-    def update(self, dry_run=True):
-        self._dry_run = dry_run
-        try:
-            dependencies_groups_map = self.get_dependencies_groups()
-        except Exception as e:
-            sys.exit(e)
-        pyproject_data = deepcopy(self.pyproject_data)
-        # update 'tomlkit.items` in-place to maintain the formatting from the original toml file
+    def apply_edits(self, pyproject_data, edits):
+        """Replace edited specifiers in place, keeping the formatting of the rest of the document."""
+        for edit in edits:
+            dep_list = pyproject_data
+            for key in edit.group:
+                dep_list = dep_list[key]
+            dep_list[edit.index] = edit.new
+
+    def write_pyproject(self, pyproject_data):
+        import tomlkit
+
+        write_pyproject_text(self.pyproject_toml_path, tomlkit.dumps(pyproject_data))
+
+    def get_dependency_arrays(self):
+        """Return `(group, dependency specifiers)` for every dependency array, where `group` is its key path."""
+        dependencies_groups_map = self.get_dependencies_groups()
+        arrays = []
         for key, project_dependencies in dependencies_groups_map.items():
             if key == "project":
-                updated_deps = self.update_dependencies(project_dependencies)
-                dep_list = pyproject_data["project"]["dependencies"]
-                for i in range(len(dep_list)):
-                    dep_list[i] = updated_deps[i]
-            if key == "optional-dependencies":
-                dep_groups = pyproject_data["project"][key]
-                for dep_list in dep_groups.values():
-                    updated_deps = self.update_dependencies(dep_list)
-                    for i in range(len(dep_list)):
-                        dep_list[i] = updated_deps[i]
-            if key == "dependency-groups":
-                dep_groups = pyproject_data[key]
-                for dep_list in dep_groups.values():
-                    updated_deps = self.update_dependencies(dep_list)
-                    for i in range(len(dep_list)):
-                        dep_list[i] = updated_deps[i]
-        if pyproject_data == self.pyproject_data:
+                arrays.append((("project", "dependencies"), project_dependencies))
+                continue
+            prefix = ("project", key) if key == "optional-dependencies" else (key,)
+            arrays.extend(((*prefix, name), dep_list) for name, dep_list in project_dependencies.items())
+        return arrays
+
+    def get_edits(self):
+        """Resolve new versions and return an `Edit` for every dependency specifier in `pyproject_data` to update."""
+        arrays = self.get_dependency_arrays()
+        # resolve every group at once, then update sequentially so log output stays in file order
+        with self.stats.phase("resolve"):
+            self.resolve_package_versions(self.get_updatable_package_names(self.get_all_dependency_specifiers()))
+        if self.http_cache is not None:
+            self.http_cache.evict()
+        edits = []
+        for group, dep_list in arrays:
+            edits.extend(self.get_dependency_edits(group, dep_list))
+        return edits
+
+    def get_pinned_versions(self, edits):
+        """Map normalized package names to the `(version, specifier)` pairs they are held to once `edits` are applied.
+
+        Bumped specifiers hold their package to its new version, since that is the newest compatible release. Other
+        specifiers only count if they pin an exact version with `==` or `===`.
+        """
+        edited = {(edit.group, edit.index): edit.new for edit in edits}
+        pinned_versions = {}
+        for group, dep_list in self.get_dependency_arrays():
+            for index, original in enumerate(dep_list):
+                try:
+                    parsed = parse_dependency_specifier(edited.get((group, index), original))
+                    version = Version(parsed.version)
+                except (ValueError, InvalidVersion):
+                    continue
+                if (group, index) in edited or parsed.operator in ("==", "==="):
+                    pinned_versions.setdefault(canonicalize_name(parsed.name), []).append((version, parsed.text))
+        return pinned_versions
+
+    def find_conflicts(self, edits):
+        """Cross-check the metadata of every bumped release against the other pins, returning a list of `Conflict`.
+
+        Metadata files are fetched concurrently. Releases without metadata files on the index aren't checked.
+        """
+        pinned_versions = self.get_pinned_versions(edits)
+        bumped = [parse_dependency_specifier(edit.new) for edit in edits]
+        releases = list(dict.fromkeys((parsed.name, parsed.version) for parsed in bumped))
+        with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            futures = {release: executor.submit(self.fetch_requires_dist, *release) for release in releases}
+        requires_dists = {release: future.result() for release, future in futures.items()}
+        conflicts = []
+        for edit, parsed in zip(edits, bumped, strict=True):
+            requirements = requires_dists[(parsed.name, parsed.version)]
+            if requirements is None:
+                logger.debug(f"no metadata file for {parsed.name} {parsed.version} on {self.index.name}")
+                continue
+            conflicts.extend(find_release_conflicts(edit.new, requirements, pinned_versions))
+        return list(dict.fromkeys(conflicts))
+
+    def _iter_fallback_versions(self, package_name, older_than, newer_than):
+        """Yield compatible stable versions of a package between two versions (exclusive), newest first."""
+        releases = self.fetch_releases(package_name)
+        if releases is None:
+            return
+        for ver, _, release_files in self._iter_stable_versions_newest_first(releases):
+            if ver >= older_than:
+                continue
+            if newer_than is not None and ver <= newer_than:
+                return
+            files = [file_info for file_info in release_files if not file_info.get("yanked")]
+            release_requires = {file_info.get("requires_python") for file_info in files}
+            if files and self._is_release_compatible(package_name, ver, release_requires, self.requires_python_spec):
+                yield str(ver)
+
+    def _find_fallback_version(self, package_name, edits, requirement=None):
+        """Find the newest release of a bumped package, older than its new version, that doesn't conflict.
+
+        With `requirement`, only its version specifier is checked. Otherwise the metadata of up to
+        `MAX_FALLBACK_CANDIDATES` older releases is fetched and checked against the other pins.
+        """
+        from packaging.requirements import Requirement
+
+        old, new = next(
+            (parse_dependency_specifier(edit.old), parse_dependency_specifier(edit.new))
+            for edit in edits
+            if canonicalize_name(parse_dependency_specifier(edit.new).name) == package_name
+        )
+        try:
+            newer_than = Version(old.version)
+        except InvalidVersion:
+            newer_than = None
+        candidates = self._iter_fallback_versions(package_name, Version(new.version), newer_than)
+        if requirement is not None:
+            specifier = Requirement(requirement).specifier
+            return next((version for version in candidates if specifier.contains(version, prereleases=True)), None)
+        pinned_versions = self.get_pinned_versions(edits)
+        pinned_versions.pop(package_name, None)
+        for _, version in zip(range(MAX_FALLBACK_CANDIDATES), candidates, strict=False):
+            requirements = self.fetch_requires_dist(package_name, version)
+            if requirements is not None and not find_release_conflicts(
+                new.with_version(version), requirements, pinned_versions
+            ):
+                return version
+        return None
+
+    def _set_package_version(self, edits, package_name, version):
+        """Return `edits` with every edit of a package changed to `version`, or dropped if `version` is None."""
+        updated_edits = []
+        for edit in edits:
+            parsed = parse_dependency_specifier(edit.old)
+            if canonicalize_name(parsed.name) != package_name:
+                updated_edits.append(edit)
+            elif version is None:
+                logger.info(f"- not updating: '{edit.old}' (no release without conflicts)")
+            else:
+                logger.info(f"- falling back: '{edit.old}' to '{parsed.with_version(version)}'")
+                updated_edits.append(edit._replace(new=parsed.with_version(version)))
+        return updated_edits
+
+    def fall_back(self, edits, conflicts):
+        """Move conflicting bumps back to the newest releases that don't conflict, returning the new edits.
+
+        If the pin excluded by a requirement was bumped too, that package falls back to the newest release the
+        requirement allows. Otherwise, the package with the requirement falls back to its newest release whose
+        metadata doesn't conflict. Packages with no such release newer than their current version aren't updated.
+        """
+        bumped = {canonicalize_name(parse_dependency_specifier(edit.new).name) for edit in edits}
+        changed = set()
+        for conflict in conflicts:
+            pinned_name = canonicalize_name(parse_dependency_specifier(conflict.pinned).name)
+            if pinned_name in bumped:
+                package_name, requirement = pinned_name, conflict.requirement
+            else:
+                package_name, requirement = canonicalize_name(parse_dependency_specifier(conflict.specifier).name), None
+            if package_name in changed:
+                continue
+            changed.add(package_name)
+            version = self._find_fallback_version(package_name, edits, requirement)
+            edits = self._set_package_version(edits, package_name, version)
+        return edits
+
+    def check_edits(self, edits):
+        """Check `edits` for conflicts, log them, and with `check_conflicts="fallback"` fall back to older releases.
+
+        Returns the edits to apply.
+        """
+        conflicts = self.find_conflicts(edits)
+        if self.check_conflicts == "fallback":
+            for _ in range(MAX_FALLBACK_ROUNDS):
+                if not conflicts:
+                    break
+                edits = self.fall_back(edits, conflicts)
+                conflicts = self.find_conflicts(edits)
+        for conflict in conflicts:
+            logger.info(
+                f"- conflict: '{conflict.specifier}' requires '{conflict.requirement}', "
+                f"which excludes '{conflict.pinned}'"
+            )
+        return edits
+
+    def _result(self, group, index, original, updated=None, reason=None, latency=None):
+        return {
+            "file": self.pyproject_toml_path,
+            "group": list(group),
+            "index": index,
+            "original": str(original),
+            "updated": updated,
+            "reason": reason,
+            "latency": latency,
+        }
+
+    def iter_results(self):
+        """Resolve new versions, yielding a result for every dependency specifier as soon as its package resolves.
+
+        Results are dicts with the `file`, `group` and `index` of the specifier, the `original` specifier, the
+        `updated` specifier (None unless it changed), the `reason` it was or wasn't updated, and the `latency` in
+        seconds of resolving its package (None if it wasn't looked up). Specifiers that can't be updated come first,
+        the rest follow in the order their packages resolve. Changes are recorded in `edits`, but not applied.
+        """
+        from tomlkit.items import InlineTable
+
+        self.edits = []
+        pending = {}
+        for group, dep_list in self.get_dependency_arrays():
+            for index, dependency_specifier in enumerate(dep_list):
+                if isinstance(dependency_specifier, InlineTable):
+                    yield self._result(group, index, dependency_specifier, reason="skipping inline table")
+                    continue
+                try:
+                    parsed = parse_dependency_specifier(dependency_specifier)
+                except ValueError as e:
+                    yield self._result(group, index, dependency_specifier, reason=str(e))
+                    continue
+                pending.setdefault(canonicalize_name(parsed.name), []).append((group, index, parsed))
+        requires_python_spec = self.requires_python_spec
+        pairs = [(package_name, requires_python_spec) for package_name in pending]
+        for package_name, new_versions, seconds in self.iter_resolve_pairs(pairs):
+            new_version = new_versions[requires_python_spec]
+            for group, index, parsed in pending[package_name]:
+                if new_version is None:
+                    reason = f"error retrieving version from {self.index.name}"
+                    if package_name in self.deadline_skipped:
+                        reason = "skipped, deadline exceeded"
+                    yield self._result(group, index, parsed.text, reason=reason, latency=seconds)
+                    continue
+                updated = parsed.with_version(new_version)
+                if updated == parsed.text:
+                    reason = "no new version available"
+                    yield self._result(group, index, parsed.text, reason=reason, latency=seconds)
+                    continue
+                self.edits.append(Edit(group, index, parsed.text, updated))
+                yield self._result(group, index, parsed.text, updated, "new version available", seconds)
+        if self.http_cache is not None:
+            self.http_cache.evict()
+
+    def write_edits(self, dry_run=True):
+        """Apply `edits` to `pyproject_data` in place, and write pyproject.toml unless `dry_run` or nothing changed."""
+        # update 'tomlkit.items` in-place to maintain the formatting from the original toml file
+        self.apply_edits(self.pyproject_data, self.edits)
+        if not self.edits:
             logger.info("\nno dependency updates needed. not writing new pyproject.toml.")
+        elif dry_run:
+            logger.info("\ndry-run enabled. not generating new pyproject.toml with updated dependencies")
         else:
-            if dry_run:
-                logger.info("\ndry-run enabled. not generating new pyproject.toml with updated dependencies")
-            else:
-                with open(self.pyproject_toml_path, "w") as f:
-                    tomlkit.dump(pyproject_data, f)
-                logger.info("\ngenerated new pyproject.toml with updated dependencies")
-        return pyproject_data
+            with self.stats.phase("write"):
+                self.write_pyproject(self.pyproject_data)
+            logger.info("\ngenerated new pyproject.toml with updated dependencies")
+        return self.pyproject_data
+
+    def update(self, dry_run=True):
+        """Update dependency specifiers in `pyproject_data` in place and return it.
+
+        The changes are recorded in `edits`, one `Edit` per changed specifier, and only edited array items are
+        replaced.
+        """
+        self.edits = self.get_edits()
+        if self.check_conflicts and self.edits:
+            with self.stats.phase("check"):
+                self.edits = self.check_edits(self.edits)
+        return self.write_edits(dry_run)
 
 
-def run(pyproject_toml_path, dry_run):
-    updater = Updater(pyproject_toml_path)
+def run(pyproject_toml_path, dry_run, **updater_options):
+    updater = Updater(pyproject_toml_path, **updater_options)
     pyproject_data = updater.update(dry_run)
     return pyproject_data
 
 
-def main():
-    def formatter(prog):
-        return argparse.HelpFormatter(prog, max_help_position=30)
+def iter_results(pyproject_toml_paths, dry_run=True, **updater_options):
+    """Yield a result for every dependency specifier of several pyproject.toml files as soon as it resolves.
+
+    Results are the dicts yielded by `Updater.iter_results`. Files that can't be loaded yield a single result with
+    only `file` and `reason` set. Unless `dry_run`, each file is written once all of its results were yielded.
+    Versions resolved for one file are reused for the next.
+    """
+    resolver = Updater(**updater_options)
+    for pyproject_toml_path in pyproject_toml_paths:
+        updater, error = _load_updater(pyproject_toml_path, resolver)
+        if error is None:
+            try:
+                yield from updater.iter_results()
+            except PyprojectError as e:
+                error = str(e)
+        if error is not None:
+            yield {
+                "file": pyproject_toml_path,
+                "group": None,
+                "index": None,
+                "original": None,
+                "updated": None,
+                "reason": f"skipped ({error})",
+                "latency": None,
+            }
+            continue
+        updater.write_edits(dry_run)
+
+
+def run_jsonl(pyproject_toml_paths, dry_run, **updater_options):
+    """Write one JSON line per dependency specifier to stdout as soon as it resolves."""
+    for result in iter_results(pyproject_toml_paths, dry_run, **updater_options):
+        sys.stdout.write(json.dumps(result) + "\n")
+        sys.stdout.flush()
+
+
+def run_matrix(pyproject_toml_path, python_versions, split_markers=False, **updater_options):
+    """Show the newest compatible version of every dependency for each target Python, without changing anything.
+
+    With `split_markers`, also show each specifier split into one specifier per Python range with `python_version`
+    markers. Returns the table from `Updater.resolve_matrix`.
+    """
+    updater = Updater(pyproject_toml_path, **updater_options)
+    dependency_specifiers = updater.get_all_dependency_specifiers()
+    parsed = {}
+    for dependency_specifier in dependency_specifiers:
+        with contextlib.suppress(ValueError):
+            parsed[str(dependency_specifier)] = parse_dependency_specifier(dependency_specifier)
+    with updater.stats.phase("resolve"):
+        table = updater.resolve_matrix([parsed_specifier.name for parsed_specifier in parsed.values()], python_versions)
+    rows = [["package", *python_versions]]
+    for package_name, new_versions in table.items():
+        rows.append([package_name, *(new_versions[python_version] or "-" for python_version in python_versions)])
+    widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+    for row in rows:
+        line = "  ".join(f"{cell:<{width}}" for cell, width in zip(row, widths, strict=True))
+        logger.info(line.rstrip())
+    if split_markers:
+        logger.info("\nspecifiers split by python_version:")
+        for dependency_specifier, parsed_specifier in parsed.items():
+            new_versions = table[canonicalize_name(parsed_specifier.name)]
+            for specifier in split_by_python_version(dependency_specifier, new_versions):
+                logger.info(f"- {specifier}")
+    return table
+
+
+def discover_pyproject_toml_paths(root_dir):
+    """Find all pyproject.toml files under a directory, skipping hidden directories and virtual environments."""
+    skipped_dirs = ("node_modules", "venv", "__pycache__", "build", "dist")
+    paths = []
+    for dir_path, dir_names, file_names in os.walk(root_dir):
+        dir_names[:] = sorted(
+            name
+            for name in dir_names
+            if not name.startswith(".")
+            and name not in skipped_dirs
+            and not os.path.exists(os.path.join(dir_path, name, "pyvenv.cfg"))
+        )
+        if "pyproject.toml" in file_names:
+            paths.append(os.path.join(dir_path, "pyproject.toml"))
+    return paths
+
+
+def expand_pyproject_toml_paths(patterns):
+    """Expand glob patterns into a list of unique pyproject.toml paths, keeping the given order."""
+    paths = []
+    for pattern in patterns:
+        if glob.has_magic(pattern):
+            paths.extend(sorted(glob.glob(pattern, recursive=True)))
+        else:
+            paths.append(pattern)
+    return list(dict.fromkeys(os.path.normpath(path) for path in paths))
+
+
+def _load_updater(pyproject_toml_path, resolver):
+    """Load and validate a pyproject.toml into an Updater sharing the resolver's session and resolved versions."""
+    updater = copy(resolver)
+    updater.pyproject_toml_path = pyproject_toml_path
+    updater.edits = []
+    try:
+        with updater.stats.phase("load"):
+            pyproject_data = updater.read_pyproject()
+        if updater.validate:
+            with updater.stats.phase("validate"):
+                updater.validate_pyproject(pyproject_data)
+    except PyprojectError as e:
+        return pyproject_toml_path, str(e)
+    updater.pyproject_data = pyproject_data
+    return updater, None
+
+
+def run_many(pyproject_toml_paths, dry_run, **updater_options):
+    """Update many pyproject.toml files in one process.
+
+    Files are loaded and validated in parallel, and every distinct (package, requires-python) pair across all files
+    is resolved once before any file is updated. Returns a map of each path to its summary line.
+    """
+    resolver = Updater(**updater_options)
+    resolver.session  # noqa: B018 create the session before it is shared with every file's Updater
+    logger.info(f"loading and validating: {len(pyproject_toml_paths)} pyproject.toml files")
+    with ThreadPoolExecutor(max_workers=resolver.jobs) as executor:
+        loaded = list(executor.map(_load_updater, pyproject_toml_paths, [resolver] * len(pyproject_toml_paths)))
+    summary = {}
+    updaters = []
+    pairs = []
+    for pyproject_toml_path, (updater, error) in zip(pyproject_toml_paths, loaded, strict=True):
+        if error is not None:
+            summary[pyproject_toml_path] = f"skipped ({error})"
+            continue
+        try:
+            package_names = updater.get_updatable_package_names(updater.get_all_dependency_specifiers())
+            requires_python_spec = updater.requires_python_spec
+            # an invalid specifier would fail the resolve shared by every file
+            _check_requires_python(requires_python_spec)
+        except (PyprojectError, RequiresPythonError) as e:
+            summary[pyproject_toml_path] = f"skipped ({e})"
+            continue
+        pairs.extend((package_name, requires_python_spec) for package_name in package_names)
+        updaters.append(updater)
+    with resolver.stats.phase("resolve"):
+        resolver.resolve_pairs(pairs)
+    for updater in updaters:
+        logger.info(f"\nupdating: {updater.pyproject_toml_path}\n")
+        updater.update(dry_run)
+        count = len(updater.edits)
+        if not count:
+            summary[updater.pyproject_toml_path] = "up to date"
+        elif dry_run:
+            summary[updater.pyproject_toml_path] = f"{count} updates available (dry-run)"
+        else:
+            summary[updater.pyproject_toml_path] = f"{count} updated"
+    logger.info("\nsummary:")
+    for pyproject_toml_path in pyproject_toml_paths:
+        logger.info(f"- {pyproject_toml_path}: {summary[pyproject_toml_path]}")
+    return summary
+
+
+class _ThreadLogCapture(logging.Handler):
+    """Collect log messages emitted by the current thread."""
+
+    def __init__(self):
+        super().__init__()
+        self.thread = threading.get_ident()
+        self.messages = []
+
+    def emit(self, record):
+        if record.thread == self.thread:
+            self.messages.append(record.getMessage())
+
+
+def _get_serve_request_error(request):
+    """Return why a decoded `/update` request body is malformed, or None if it is well-formed."""
+    if not isinstance(request, dict):
+        return "expected a JSON object"
+    if not isinstance(request.get("pyproject"), str):
+        return "'pyproject' must be a string"
+    if not isinstance(request.get("path", ""), str):
+        return "'path' must be a string"
+    if not isinstance(request.get("validate", True), bool):
+        return "'validate' must be a boolean"
+    return None
+
+
+def _serve_update(resolver, request):
+    """Compute the updates of one pyproject.toml for a client, returning `(HTTP status, response)`."""
+    import tomlkit
+
+    updater = copy(resolver)
+    updater.pyproject_toml_path = request.get("path", "pyproject.toml")
+    updater.validate = request.get("validate", True)
+    updater.edits = []
+    capture = _ThreadLogCapture()
+    logger.addHandler(capture)
+    try:
+        try:
+            pyproject_data = tomlkit.loads(request["pyproject"])
+        except Exception as e:
+            raise PyprojectError(f"invalid pyproject.toml: {e}") from e
+        if updater.validate:
+            updater.validate_pyproject(pyproject_data)
+        updater.pyproject_data = pyproject_data
+        updater.edits = updater.get_edits()
+        updater.apply_edits(pyproject_data, updater.edits)
+    except BumpDependenciesError as e:
+        return 400, {"error": str(e), "messages": capture.messages}
+    except Exception as e:
+        # answer instead of dropping the connection, and keep the traceback in the server's log
+        logger.exception(f"error updating {updater.pyproject_toml_path}")
+        return 500, {"error": f"internal error: {e}", "messages": capture.messages}
+    finally:
+        logger.removeHandler(capture)
+    return 200, {
+        "messages": capture.messages,
+        "edits": [edit._asdict() for edit in updater.edits],
+        "pyproject": tomlkit.dumps(pyproject_data) if updater.edits else None,
+    }
+
+
+def make_server(host=DEFAULT_SERVE_HOST, port=DEFAULT_SERVE_PORT, resolve_ttl=DEFAULT_CACHE_TTL, **updater_options):
+    """Create an HTTP server computing updates for `bump_dependencies --server` clients.
+
+    Every request is handled by a copy of one Updater, so the HTTP session, resolved versions and parsed releases are
+    shared across requests and clients. Resolved versions and releases are forgotten after `resolve_ttl` seconds.
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    resolver = Updater(keep_releases=True, **updater_options)
+    resolver.session  # noqa: B018 create the session before it is shared between threads
+    lock = threading.Lock()
+    resolved_at = [time.monotonic()]
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _send_json(self, status, response):
+            body = json.dumps(response).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            if self.path != "/update":
+                self._send_json(404, {"error": f"not found: {self.path}"})
+                return
+            try:
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            except ValueError as e:
+                self._send_json(400, {"error": f"invalid request: {e}"})
+                return
+            error = _get_serve_request_error(request)
+            if error is not None:
+                self._send_json(400, {"error": f"invalid request: {error}"})
+                return
+            with lock:
+                if time.monotonic() - resolved_at[0] > resolve_ttl:
+                    resolver.forget_resolved()
+                    resolved_at[0] = time.monotonic()
+            self._send_json(*_serve_update(resolver, request))
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    return server
+
+
+def serve(host=DEFAULT_SERVE_HOST, port=DEFAULT_SERVE_PORT, resolve_ttl=DEFAULT_CACHE_TTL, **updater_options):
+    server = make_server(host, port, resolve_ttl, **updater_options)
+    logger.info(f"serving on http://{host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def run_remote(server_url, pyproject_toml_path, dry_run, validate=True):
+    """Update a pyproject.toml through a `bump_dependencies serve` process, returning the edits as dicts."""
+    import http.client
+
+    logger.info(f"loading: {pyproject_toml_path}")
+    try:
+        with open(pyproject_toml_path) as f:
+            text = f.read()
+    except FileNotFoundError:
+        sys.exit("\nno pyproject.toml found")
+    url = urlsplit(server_url)
+    body = json.dumps({"path": pyproject_toml_path, "pyproject": text, "validate": validate})
+    connection = http.client.HTTPConnection(url.hostname, url.port, timeout=SERVE_TIMEOUT)
+    try:
+        connection.request("POST", "/update", body, {"Content-Type": "application/json"})
+        response = connection.getresponse()
+        result = json.loads(response.read())
+    except (OSError, http.client.HTTPException, ValueError) as e:
+        sys.exit(f"can't get updates from {server_url}: {e}")
+    finally:
+        connection.close()
+    for message in result.get("messages", []):
+        logger.info(message)
+    if response.status != 200:
+        sys.exit(result.get("error"))
+    edits = result["edits"]
+    if not edits:
+        logger.info("\nno dependency updates needed. not writing new pyproject.toml.")
+    elif dry_run:
+        logger.info("\ndry-run enabled. not generating new pyproject.toml with updated dependencies")
+    else:
+        write_pyproject_text(pyproject_toml_path, result["pyproject"])
+        logger.info("\ngenerated new pyproject.toml with updated dependencies")
+    return edits
+
+
+def _add_index_arguments(parser):
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=DEFAULT_JOBS,
+        metavar="N",
+        help=f"number of concurrent package index lookups (defaults to {DEFAULT_JOBS})",
+    )
+    index_group = parser.add_mutually_exclusive_group()
+    index_group.add_argument(
+        "--index-url",
+        action="append",
+        dest="index_urls",
+        metavar="URL",
+        help="base URL of a simple package index, can be repeated to query several indexes in parallel, in priority "
+        f"order (defaults to {DEFAULT_INDEX_URL})",
+    )
+    index_group.add_argument(
+        "--offline-index",
+        metavar="PATH",
+        help="directory or archive of pre-fetched per-package JSON files to use instead of a remote index",
+    )
+    parser.add_argument(
+        "--route",
+        action="append",
+        dest="routes",
+        metavar="PATTERN=URL",
+        help="only look up packages whose name matches a glob pattern (like 'acme-*') on this index, can be repeated",
+    )
+    parser.add_argument(
+        "--hedge-mirror",
+        metavar="URL",
+        help="send hedged duplicates of slow requests to this mirror of the first index (defaults to the index itself)",
+    )
+    parser.add_argument(
+        "--no-hedge",
+        action="store_false",
+        dest="hedge",
+        help="don't send a hedged duplicate when a request is slower than 95%% of recent requests",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default=default_cache_dir(),
+        metavar="DIR",
+        help="directory for cached index responses (defaults to user cache directory)",
+    )
+    parser.add_argument(
+        "--cache-ttl",
+        type=int,
+        default=DEFAULT_CACHE_TTL,
+        metavar="SECONDS",
+        help=f"use cached responses without revalidating for this long (defaults to {DEFAULT_CACHE_TTL})",
+    )
+    parser.add_argument(
+        "--negative-cache-ttl",
+        type=int,
+        default=DEFAULT_NEGATIVE_CACHE_TTL,
+        metavar="SECONDS",
+        help=(
+            "with several indexes, don't look a package up again on an index that answered 404 for this long "
+            f"(defaults to {DEFAULT_NEGATIVE_CACHE_TTL})"
+        ),
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        dest="no_cache",
+        help="don't read or write cached index responses and validation results",
+    )
+
+
+def _get_simple_index(parser, args):
+    """Return the index for `--index-url` options, or a `MultiIndex` for several indexes or any `--route`."""
+    indexes = {}
+    for index_url in args.index_urls or [DEFAULT_INDEX_URL]:
+        mirror_url = args.hedge_mirror if not indexes else None
+        indexes.setdefault(index_url.rstrip("/"), SimpleIndex(index_url, mirror_url=mirror_url))
+    route_indexes = {}
+    routes = []
+    for route in args.routes or []:
+        pattern, _, index_url = route.partition("=")
+        if not pattern or not index_url:
+            parser.error(f"--route must be PATTERN=URL: '{route}'")
+        index_url = index_url.rstrip("/")
+        if index_url not in indexes:
+            route_indexes.setdefault(index_url, SimpleIndex(index_url))
+        routes.append((pattern, indexes.get(index_url) or route_indexes[index_url]))
+    if len(indexes) == 1 and not routes:
+        return next(iter(indexes.values()))
+    negative_cache = None if args.no_cache else NegativeCache(args.cache_dir, ttl=args.negative_cache_ttl)
+    return MultiIndex(indexes.values(), routes, negative_cache=negative_cache, jobs=args.jobs)
+
+
+def _get_index_options(parser, args):
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    try:
+        index = SnapshotIndex(args.offline_index) if args.offline_index else _get_simple_index(parser, args)
+    except (OSError, tarfile.TarError) as e:
+        sys.exit(f"invalid offline index: {e}")
+    return {
+        "jobs": args.jobs,
+        "index": index,
+        "hedge": args.hedge,
+        "http_cache": None if args.no_cache else HTTPCache(args.cache_dir, ttl=args.cache_ttl),
+        "validation_cache": None if args.no_cache else ValidationCache(args.cache_dir),
+    }
+
+
+def _python_versions(value):
+    python_versions = [python_version.strip() for python_version in value.split(",") if python_version.strip()]
+    invalid = [python_version for python_version in python_versions if not re.fullmatch(r"\d+\.\d+", python_version)]
+    if invalid or not python_versions:
+        raise argparse.ArgumentTypeError(f"expected comma separated Python minor versions like 3.12: '{value}'")
+    return python_versions
+
+
+def _formatter(prog):
+    return argparse.HelpFormatter(prog, max_help_position=30)
+
+
+def serve_main(argv):
+    parser = argparse.ArgumentParser(prog="bump_dependencies serve", formatter_class=_formatter)
+    parser.add_argument(
+        "--host",
+        default=DEFAULT_SERVE_HOST,
+        help=f"address to listen on (defaults to {DEFAULT_SERVE_HOST})",
+    )
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=DEFAULT_SERVE_PORT,
+        help=f"port to listen on (defaults to {DEFAULT_SERVE_PORT})",
+    )
+    parser.add_argument(
+        "--resolve-ttl",
+        type=int,
+        default=DEFAULT_CACHE_TTL,
+        metavar="SECONDS",
+        help=f"forget resolved versions after this long (defaults to {DEFAULT_CACHE_TTL})",
+    )
+    _add_index_arguments(parser)
+    args = parser.parse_args(argv)
+    serve(host=args.host, port=args.port, resolve_ttl=args.resolve_ttl, **_get_index_options(parser, args))
 
-    parser = argparse.ArgumentParser(formatter_class=formatter)
+
+# options that only apply when resolving locally, as (option, argument name)
+_LOCAL_OPTIONS = (
+    ("--jobs", "jobs"),
+    ("--index-url", "index_urls"),
+    ("--offline-index", "offline_index"),
+    ("--route", "routes"),
+    ("--hedge-mirror", "hedge_mirror"),
+    ("--no-hedge", "hedge"),
+    ("--cache-dir", "cache_dir"),
+    ("--cache-ttl", "cache_ttl"),
+    ("--negative-cache-ttl", "negative_cache_ttl"),
+    ("--no-cache", "no_cache"),
+    ("--state-file", "state_file"),
+    ("--deadline", "deadline"),
+    ("--check-conflicts", "check_conflicts"),
+    ("--format", "format"),
+    ("--python-matrix", "python_matrix"),
+    ("--timings", "timings"),
+    ("--stats-json", "stats_json"),
+)
+
+
+def _check_option_combinations(parser, args):
+    """Exit with a usage error for options that would be ignored, rather than silently doing something else."""
+    if args.server:
+        for option, dest in _LOCAL_OPTIONS:
+            if getattr(args, dest) != parser.get_default(dest):
+                parser.error(f"{option} can't be used with --server")
+    if args.python_matrix and args.format == "jsonl":
+        parser.error("--python-matrix can't be used with --format jsonl")
+    if args.check_conflicts and (args.python_matrix or args.format == "jsonl"):
+        parser.error("--check-conflicts can't be used with --python-matrix or --format jsonl")
+    if args.split_markers and not args.python_matrix:
+        parser.error("--split-markers requires --python-matrix")
+
+
+def main():
+    if sys.argv[1:2] == ["serve"]:
+        serve_main(sys.argv[2:])
+        return
+    parser = argparse.ArgumentParser(
+        formatter_class=_formatter,
+        epilog="run 'bump_dependencies serve -h' for the options of the long-running server",
+    )
     parser.add_argument(
         "--dry-run",
         action="store_true",
@@ -325,8 +2845,113 @@ def main():
     )
     parser.add_argument(
         "--path",
-        default=str(Path.cwd() / "pyproject.toml"),
-        help="path to pyproject.toml (defaults to current directory)",
+        action="append",
+        dest="paths",
+        metavar="PATH",
+        help="path or glob pattern of pyproject.toml, can be repeated (defaults to current directory)",
+    )
+    parser.add_argument(
+        "--discover",
+        metavar="DIR",
+        help="update every pyproject.toml found under this directory",
+    )
+    _add_index_arguments(parser)
+    parser.add_argument(
+        "--no-validate",
+        action="store_false",
+        dest="validate",
+        help="don't validate pyproject.toml",
+    )
+    parser.add_argument(
+        "--state-file",
+        metavar="PATH",
+        help="record resolved versions and the index serial here, and only re-check packages changed since last run",
+    )
+    parser.add_argument(
+        "--deadline",
+        type=float,
+        metavar="SECONDS",
+        help="stop waiting for packages not resolved after this long, and report them as skipped",
+    )
+    parser.add_argument(
+        "--check-conflicts",
+        nargs="?",
+        const="report",
+        choices=("report", "fallback"),
+        metavar="MODE",
+        help="check the Requires-Dist metadata of bumped releases against the other pins, and 'report' conflicts or "
+        "'fallback' to the newest releases without them (defaults to 'report')",
+    )
+    parser.add_argument(
+        "--format",
+        choices=("text", "jsonl"),
+        default="text",
+        help="'jsonl' writes one JSON result per dependency to stdout as soon as it resolves (defaults to 'text')",
+    )
+    parser.add_argument(
+        "--python-matrix",
+        type=_python_versions,
+        metavar="VERSIONS",
+        help="show the newest compatible version of each dependency for these Pythons (like 3.10,3.11,3.12) "
+        "instead of updating",
+    )
+    parser.add_argument(
+        "--split-markers",
+        action="store_true",
+        help="with --python-matrix, also show specifiers split by python_version markers",
+    )
+    parser.add_argument(
+        "--server",
+        metavar="URL",
+        help="send pyproject.toml to a running 'bump_dependencies serve' process instead of resolving locally",
+    )
+    parser.add_argument(
+        "--timings",
+        action="store_true",
+        help="show time spent in each phase and the slowest packages to resolve",
+    )
+    parser.add_argument(
+        "--stats-json",
+        metavar="PATH",
+        help="write per-phase and per-package timings, request counts and bytes received to a JSON file",
     )
     args = parser.parse_args()
-    run(pyproject_toml_path=args.path, dry_run=args.dry_run)
+    _check_option_combinations(parser, args)
+    paths = expand_pyproject_toml_paths(args.paths or [])
+    if args.discover:
+        paths.extend(path for path in discover_pyproject_toml_paths(args.discover) if path not in paths)
+    if not args.paths and not args.discover:
+        paths = [str(Path.cwd() / "pyproject.toml")]
+    if not paths:
+        sys.exit("no pyproject.toml found")
+    if args.server:
+        for pyproject_toml_path in paths:
+            run_remote(args.server, pyproject_toml_path, dry_run=args.dry_run, validate=args.validate)
+        return
+    updater_options = {
+        **_get_index_options(parser, args),
+        "validate": args.validate,
+        "stats": Stats(),
+        "state": StateFile(args.state_file) if args.state_file else None,
+        "check_conflicts": args.check_conflicts,
+        "deadline": args.deadline,
+    }
+    try:
+        if args.format == "jsonl":
+            run_jsonl(paths, dry_run=args.dry_run, **updater_options)
+        elif args.python_matrix:
+            for pyproject_toml_path in paths:
+                run_matrix(pyproject_toml_path, args.python_matrix, args.split_markers, **updater_options)
+        elif len(paths) == 1 and not args.discover:
+            run(pyproject_toml_path=paths[0], dry_run=args.dry_run, **updater_options)
+        else:
+            run_many(paths, dry_run=args.dry_run, **updater_options)
+    except BumpDependenciesError as e:
+        sys.exit(f"\n{e}")
+    finally:
+        stats = updater_options["stats"]
+        if args.timings:
+            logger.info(f"\n{stats.format_summary()}")
+        if args.stats_json:
+            with open(args.stats_json, "w") as f:
+                json.dump(stats.to_dict(), f, indent=2)
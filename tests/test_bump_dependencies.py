@@ -4,9 +4,19 @@
 
 """Tests for bump_dependencies module."""
 
+import json
+import os
 import re
+import shutil
+import subprocess
+import sys
+import threading
+import time
+import xmlrpc.client
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
 import pytest
+import requests
 import tomlkit
 
 import bump_dependencies as bd
@@ -164,28 +174,128 @@ def test_name_and_operator_with_direct_reference_specifier(direct_reference_spec
         bd.Updater().get_dependency_name_and_operator(direct_reference_specifier)
 
 
-def test_fetch_resolved_package_version():
-    updater = bd.Updater()
+@pytest.fixture
+def offline_index(tmp_path):
+    snapshot = {
+        "files": [
+            {"filename": "bump_dependencies-0.1.0.tar.gz", "requires-python": ">=3.9"},
+            {"filename": "bump_dependencies-0.1.8-py3-none-any.whl", "requires-python": ">=3.10"},
+            {"filename": "bump_dependencies-0.2.0a1-py3-none-any.whl", "requires-python": ">=3.10"},
+        ]
+    }
+    index_dir = tmp_path / "index"
+    index_dir.mkdir()
+    (index_dir / "bump-dependencies.json").write_text(json.dumps(snapshot))
+    return bd.SnapshotIndex(str(index_dir))
+
+
+def test_fetch_resolved_package_version(offline_index):
+    updater = bd.Updater(index=offline_index)
     updater.requires_python_spec = ">=3.13"
     version = updater.fetch_new_package_version("bump-dependencies")
-    assert isinstance(version, str)
-    assert version[0].isdigit()
+    assert version == "0.1.8"
 
 
-def test_fetch_latest_package_version_with_incompatible_package():
-    updater = bd.Updater()
+def test_fetch_latest_package_version_with_incompatible_package(offline_index):
+    updater = bd.Updater(index=offline_index)
     updater.requires_python_spec = "==3.0"
     version = updater.fetch_new_package_version("bump-dependencies")
     assert version is None
 
 
-def test_fetch_latest_package_version_with_unavailable_package():
-    updater = bd.Updater()
+def test_fetch_latest_package_version_with_unavailable_package(offline_index):
+    updater = bd.Updater(index=offline_index)
     updater.requires_python_spec = ">=3.13"
     version = updater.fetch_new_package_version("definitely-not-a-package-found-on-pypi-1234")
     assert version is None
 
 
+def test_resolve_many(monkeypatch, offline_index):
+    updater = bd.Updater(index=offline_index)
+    resolutions = updater.resolve_many(["Bump_Dependencies", "missing", "bump-dependencies"], ">=3.13")
+    assert resolutions[0] == bd.Resolution("bump-dependencies", "0.1.8", None, resolutions[0].seconds)
+    assert resolutions[0].seconds >= 0
+    assert resolutions[1] == bd.Resolution(
+        "missing", None, "error retrieving versions from index", resolutions[1].seconds
+    )
+    assert resolutions[2] == resolutions[0]
+    assert updater.resolve_many(["bump-dependencies"], "==3.0")[0].reason == "no compatible stable release"
+    monkeypatch.setattr(offline_index, "fetch_releases", None)
+    assert updater.resolve_many(["bump-dependencies"], ">=3.13") == [
+        bd.Resolution("bump-dependencies", "0.1.8", None, 0.0)
+    ]
+
+
+@pytest.mark.parametrize(
+    ("requires_python", "snapshot_requires_python", "match"),
+    [
+        ("not-a-specifier", ">=3.9", r"invalid requires-python specifier 'not-a-specifier'"),
+        (">=3.13", "python3", r"invalid requires-python specifier in bump-dependencies 1\.0: 'python3'"),
+    ],
+)
+def test_resolve_many_raises_on_invalid_requires_python(tmp_path, requires_python, snapshot_requires_python, match):
+    (tmp_path / "bump-dependencies.json").write_text(
+        json.dumps(
+            {"files": [{"filename": "bump_dependencies-1.0.tar.gz", "requires-python": snapshot_requires_python}]}
+        )
+    )
+    updater = bd.Updater(index=bd.SnapshotIndex(str(tmp_path)))
+    with pytest.raises(bd.RequiresPythonError, match=match):
+        updater.resolve_many(["bump-dependencies"], requires_python)
+
+
+def test_update_raises_on_missing_pyproject(tmp_path):
+    with pytest.raises(bd.PyprojectError, match=r"no pyproject\.toml found"):
+        bd.Updater(str(tmp_path / "pyproject.toml"))
+    path = tmp_path / "pyproject.toml"
+    path.write_text('[project]\nname = "x"\nversion = "1.0"\nrequires-python = ">=3.10"\n')
+    with pytest.raises(bd.PyprojectError, match="no dependencies found"):
+        bd.Updater(str(path), validate=False).update()
+
+
+def test_parse_dependency_specifier():
+    parsed = bd.parse_dependency_specifier("Foo[ bar, baz ] ~= 1.0.0 ; python_version < '4.0'")
+    assert parsed.name == "Foo"
+    assert parsed.extras == ("bar", "baz")
+    assert parsed.dependency_name == "Foo[bar,baz]"
+    assert parsed.operator == "~="
+    assert parsed.version == "1.0.0"
+    assert parsed.marker == 'python_version < "4.0"'
+    assert parsed.with_version("2.0") == "Foo[ bar, baz ] ~= 2.0 ; python_version < '4.0'"
+    assert bd.parse_dependency_specifier(parsed.text) is parsed
+    parsed = bd.parse_dependency_specifier("foo[bar] (==1.0)")
+    assert parsed.dependency_name == "foo[bar]"
+    assert parsed.extras == ("bar",)
+    assert parsed.version == "1.0"
+
+
+@pytest.mark.parametrize(
+    ("dependency_specifier", "expected"),
+    [
+        ("foo==1.0", "foo==2.0"),
+        ("foo[bar] == 1.0", "foo[bar] == 2.0"),
+        ("  foo > 1.0  ", "  foo > 2.0  "),
+        ("foo~=1.0.0;python_version>'2.7'", "foo~=2.0;python_version>'2.7'"),
+        ("foo == 1.0; os_name=='a' or os_name=='b'", "foo == 2.0; os_name=='a' or os_name=='b'"),
+        ("foo (==1.0)", "foo (==2.0)"),
+        ("foo[bar] ( >= 1.0 ) ; python_version>'3.8'", "foo[bar] ( >= 2.0 ) ; python_version>'3.8'"),
+    ],
+)
+def test_update_dependency_keeps_formatting(monkeypatch, dependency_specifier, expected):
+    updater = bd.Updater()
+    monkeypatch.setattr(updater, "resolve_package_version", lambda _package_name: "2.0")
+    assert updater.update_dependency(dependency_specifier) == expected
+
+
+def test_update_dependencies_does_not_record_edits(monkeypatch):
+    updater = bd.Updater()
+    monkeypatch.setattr(updater, "resolve_package_version", lambda _package_name: "2.0")
+    dependency_specifiers = ["foo==1.0", "bar", "baz>=2.0"]
+    assert updater.update_dependencies(dependency_specifiers) == ["foo==2.0", "bar", "baz>=2.0"]
+    assert dependency_specifiers == ["foo==1.0", "bar", "baz>=2.0"]
+    assert updater.edits == []
+
+
 def test_package_base_name(package_name):
     base_name = bd.Updater().get_package_base_name(package_name)
     assert base_name == "foo"
@@ -249,3 +359,1046 @@ def test_update():
     updated_data = updater.update(dry_run=True)
     assert isinstance(updated_data, tomlkit.toml_document.TOMLDocument)
     assert re.match(pyproject_toml_pattern, tomlkit.dumps(updated_data))
+
+
+@pytest.mark.parametrize("jobs", [1, 4])
+def test_update_concurrent_keeps_order(monkeypatch, jobs):
+    fetched = []
+
+    def fake_fetch_releases(package_name):
+        fetched.append(package_name)
+        return {"99.0": [{"requires_python": ">=3.8"}]}
+
+    updater = bd.Updater(jobs=jobs)
+    updater.pyproject_data = tomlkit.loads(pyproject_toml_data)
+    monkeypatch.setattr(updater, "fetch_releases", fake_fetch_releases)
+    updated_data = updater.update(dry_run=True)
+    assert sorted(fetched) == sorted(
+        ["requests", "numpy", "pandas", "pysocks", "httpbin", "build", "pytest", "pytest-timeout"]
+    )
+    assert updated_data["project"]["dependencies"] == ["requests==99.0", "numpy>=99.0", "pandas~=99.0"]
+    assert updated_data["dependency-groups"]["dev"] == ["wheel", "build>=99.0"]
+
+
+def test_invalid_jobs():
+    with pytest.raises(ValueError, match=r"number of jobs must be at least 1"):
+        bd.Updater(jobs=0)
+
+
+def test_resolve_package_versions_once_per_normalized_name(monkeypatch):
+    fetched = []
+
+    def fake_fetch_releases(package_name):
+        fetched.append(package_name)
+        return None if package_name == "missing" else {"2.0": [{"requires_python": None}]}
+
+    updater = bd.Updater()
+    updater.requires_python_spec = ">=3.9"
+    monkeypatch.setattr(updater, "fetch_releases", fake_fetch_releases)
+    updater.resolve_package_versions(["Foo_Bar", "foo-bar", "foo.bar", "missing", "Missing"])
+    assert updater.update_dependency("foo_bar[baz]==1.0") == "foo_bar[baz]==2.0"
+    assert updater.update_dependency("FOO-BAR>=1.0") == "FOO-BAR>=2.0"
+    assert updater.update_dependency("missing==1.0") is None
+    assert sorted(fetched) == ["foo-bar", "missing"]
+
+
+class FakeResponse:
+    def __init__(self, status_code=200, content=b"{}", headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return json.loads(self.content)
+
+
+def test_http_cache_revalidates_stale_entries(monkeypatch, tmp_path):
+    url = "https://pypi.org/pypi/foo/json"
+    requests_sent = []
+
+    def fake_get(url, headers, timeout):  # noqa: ARG001
+        requests_sent.append(headers)
+        if headers.get("If-None-Match") == '"v1"':
+            return FakeResponse(status_code=304, content=b"")
+        return FakeResponse(content=b'{"foo": 1}', headers={"ETag": '"v1"'})
+
+    updater = bd.Updater(http_cache=bd.HTTPCache(tmp_path, ttl=0))
+    monkeypatch.setattr(updater.session, "get", fake_get)
+    assert updater.fetch(url) == ("", b'{"foo": 1}')
+    assert updater.fetch(url) == ("", b'{"foo": 1}')
+    assert requests_sent == [{}, {"If-None-Match": '"v1"'}]
+    updater.http_cache.ttl = 60
+    assert updater.fetch(url) == ("", b'{"foo": 1}')
+    assert len(requests_sent) == 2
+
+
+def test_http_cache_evicts_least_recently_used(tmp_path):
+    http_cache = bd.HTTPCache(tmp_path)
+    for name in ("a", "b", "c"):
+        http_cache.store(name, FakeResponse(content=b"x" * 4))
+    http_cache.store_releases("a", b"x" * 32, {"1.0": [{"requires_python": None, "yanked": False}] * 100})
+    for i, name in enumerate(("a", "b", "c")):
+        body_path, meta_path = http_cache._paths(name)  # noqa: SLF001
+        for path in (body_path, meta_path, body_path.removesuffix(".body") + ".releases"):
+            if os.path.exists(path):
+                os.utime(path, (i, i))
+    # the bodies alone fit, but the metadata and release index files count too
+    http_cache.max_size = sum(path.stat().st_size for path in tmp_path.iterdir()) - 1
+    http_cache.evict()
+    assert sum(path.stat().st_size for path in tmp_path.iterdir()) <= http_cache.max_size
+    assert http_cache.get("a") is None
+    assert http_cache.get_releases("a", b"x" * 32) is None
+    assert http_cache.get("b") is not None
+    assert http_cache.get("c") is not None
+
+
+@pytest.mark.parametrize(("hedge", "pool_size"), [(False, 16), (True, 32)])
+def test_session_pool_sized_to_jobs(hedge, pool_size):
+    updater = bd.Updater(jobs=16, hedge=hedge)
+    adapter = updater.session.get_adapter("https://pypi.org")
+    assert adapter.poolmanager.connection_pool_kw["maxsize"] == pool_size
+    assert adapter.max_retries.total == bd.DEFAULT_RETRIES
+    assert 429 in adapter.max_retries.status_forcelist
+
+
+def test_fetch_connection_error(monkeypatch):
+    def fake_get(_url, **_kwargs):
+        raise requests.exceptions.ConnectionError
+
+    updater = bd.Updater()
+    monkeypatch.setattr(updater.session, "get", fake_get)
+    assert updater.fetch("https://pypi.org/pypi/foo/json") is None
+
+
+def test_latency_tracker_adapts_timeouts():
+    latency = bd.LatencyTracker(size=100, min_samples=20)
+    assert latency.timeout() == bd.REQUEST_TIMEOUT
+    assert latency.hedge_delay() is None
+    for i in range(100):
+        latency.add(0.1 if i < 95 else 0.9)
+    assert latency.percentile(0.5) == 0.1
+    assert latency.hedge_delay() == 0.9
+    assert latency.timeout() == 3.6
+    for _ in range(100):
+        latency.add(0.001)
+    assert latency.hedge_delay() == bd.MIN_HEDGE_DELAY
+    assert latency.timeout() == bd.MIN_REQUEST_TIMEOUT
+
+
+def test_fetch_hedges_slow_requests_to_mirror(monkeypatch):
+    release = threading.Event()
+    requested = []
+
+    def fake_get(url, **kwargs):
+        requested.append((url, kwargs["timeout"]))
+        if url.startswith("https://pypi.org/"):
+            release.wait(5)
+            return FakeResponse(content=b"slow")
+        return FakeResponse(content=b"fast")
+
+    updater = bd.Updater(index=bd.SimpleIndex("https://pypi.org/simple", mirror_url="https://mirror.example/simple/"))
+    monkeypatch.setattr(updater.session, "get", fake_get)
+    for _ in range(updater.latency.min_samples):
+        updater.latency.add(0.01)
+    try:
+        assert updater.fetch("https://pypi.org/simple/foo/") == ("", b"fast")
+    finally:
+        release.set()
+    assert requested == [
+        ("https://pypi.org/simple/foo/", bd.MIN_REQUEST_TIMEOUT),
+        ("https://mirror.example/simple/foo/", bd.MIN_REQUEST_TIMEOUT),
+    ]
+
+
+def test_deadline_skips_unresolved_packages(monkeypatch, tmp_path, caplog):
+    path = tmp_path / "pyproject.toml"
+    path.write_text(
+        '[project]\nname = "x"\nversion = "1.0"\nrequires-python = ">=3.10"\n'
+        'dependencies = ["fast==1.0", "slow==1.0"]\n'
+    )
+    release = threading.Event()
+
+    def fake_fetch_new_package_versions(package_name, requires_python_specs):
+        if package_name == "slow":
+            release.wait(5)
+        return ["2.0"] * len(requires_python_specs)
+
+    updater = bd.Updater(str(path), validate=False, deadline=0.2)
+    monkeypatch.setattr(updater, "_fetch_new_package_versions", fake_fetch_new_package_versions)
+    try:
+        with caplog.at_level("INFO", logger="updater"):
+            updater.update(dry_run=True)
+        edits = updater.edits
+        results = list(updater.iter_results())
+    finally:
+        release.set()
+    assert [edit.new for edit in edits] == ["fast==2.0"]
+    assert "- not updating: 'slow==1.0' (skipped, deadline exceeded)" in caplog.text
+    assert updater.deadline_skipped == {"slow"}
+    assert [result["reason"] for result in results] == ["no new version available", "skipped, deadline exceeded"]
+
+
+def test_timed_out_requests_raise_adaptive_timeout(monkeypatch):
+    monkeypatch.setattr(bd, "MIN_REQUEST_TIMEOUT", 0.01)
+
+    def slow_get(_url, timeout, **_kwargs):
+        time.sleep(timeout)
+        raise requests.exceptions.ConnectionError
+
+    updater = bd.Updater(hedge=False)
+    for _ in range(25):
+        updater.latency.add(0.001)
+    assert updater.request_timeout() == 0.01
+    monkeypatch.setattr(updater.session, "get", slow_get)
+    for _ in range(3):
+        assert updater.fetch("https://pypi.org/simple/foo/") is None
+    assert updater.request_timeout() >= 0.04
+
+
+def test_deadline_budget_starts_with_each_run(monkeypatch, offline_index):
+    requested = []
+
+    def fake_get(url, **_kwargs):
+        requested.append(url)
+        raise requests.exceptions.ConnectionError
+
+    updater = bd.Updater(index=offline_index, deadline=0.2)
+    time.sleep(0.3)
+    assert updater.resolve_many(["bump-dependencies"], ">=3.10")[0].version == "0.1.8"
+    updater.deadline = 0
+    assert updater.resolve_many(["foo"], ">=3.10")[0].reason == "skipped, deadline exceeded"
+    monkeypatch.setattr(updater.session, "get", fake_get)
+    assert updater.fetch("https://pypi.org/simple/foo/") is None
+    assert updater.last_fetch_error() == "deadline exceeded"
+    assert requested == []
+
+
+def test_deadline_stops_retries(monkeypatch):
+    requested = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            requested.append(self.path)
+            self.send_response(503)
+            self.send_header("Retry-After", "30")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        index = bd.SimpleIndex(f"http://127.0.0.1:{server.server_address[1]}/simple")
+        updater = bd.Updater(index=index, hedge=False, deadline=5)
+        monkeypatch.setattr(updater.latency, "timeout", lambda: 1)
+        [resolution] = updater.resolve_many(["foo"], ">=3.10")
+        assert resolution.reason == "error retrieving versions from 127.0.0.1:" + str(server.server_address[1])
+        assert resolution.seconds < 5
+        assert requested == ["/simple/foo/"]
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_multi_index_routes_prioritizes_and_caches_missing_packages(monkeypatch, tmp_path):
+    packages = {
+        "https://pypi.example/simple/": {"requests": "2.0", "shadowed": "9.0"},
+        "https://internal.example/simple/": {"acme-lib": "1.0", "corp-tool": "3.0", "shadowed": "1.0"},
+    }
+    requested = []
+
+    class NotFoundResponse(FakeResponse):
+        def raise_for_status(self):
+            raise requests.exceptions.HTTPError(response=self)
+
+    def fake_get(url, **kwargs):  # noqa: ARG001
+        requested.append(url)
+        index_url, _, name = url.rstrip("/").rpartition("/")
+        version = packages.get(f"{index_url}/", {}).get(name)
+        if version is None:
+            return NotFoundResponse(status_code=404)
+        data = {"files": [{"filename": f"{name.replace('-', '_')}-{version}.tar.gz"}]}
+        return FakeResponse(content=json.dumps(data).encode(), headers={"Content-Type": bd.SIMPLE_JSON_CONTENT_TYPE})
+
+    pypi = bd.SimpleIndex("https://pypi.example/simple")
+    internal = bd.SimpleIndex("https://internal.example/simple")
+    index = bd.MultiIndex([pypi, internal], [("Corp_*", internal)], negative_cache=bd.NegativeCache(tmp_path))
+    updater = bd.Updater(index=index, hedge=False)
+    monkeypatch.setattr(updater.session, "get", fake_get)
+    assert index.name == "pypi.example + internal.example"
+    assert updater.fetch_new_package_version("requests", ">=3.10") == "2.0"
+    assert updater.fetch_new_package_version("shadowed", ">=3.10") == "9.0"
+    assert updater.fetch_new_package_version("acme-lib", ">=3.10") == "1.0"
+    requested.clear()
+    assert updater.fetch_new_package_version("acme-lib", ">=3.10") == "1.0"
+    assert updater.fetch_new_package_version("corp-tool", ">=3.10") == "3.0"
+    assert updater.fetch_new_package_version("missing", ">=3.10") is None
+    # lookups of lower-priority indexes can still be in flight after a higher-priority index answered
+    assert sorted(url for url in requested if "/requests" not in url and "/shadowed" not in url) == [
+        "https://internal.example/simple/acme-lib/",
+        "https://internal.example/simple/corp-tool/",
+        "https://internal.example/simple/missing/",
+        "https://pypi.example/simple/missing/",
+    ]
+    assert index.negative_cache.contains("https://pypi.example/simple", "acme-lib")
+    assert not index.negative_cache.contains("https://internal.example/simple", "acme-lib")
+
+
+@pytest.mark.parametrize(("internal_error", "expected"), [(None, None), (404, "9.0")])
+def test_multi_index_only_falls_back_when_package_is_missing(monkeypatch, internal_error, expected):
+    class ErrorResponse(FakeResponse):
+        def raise_for_status(self):
+            raise requests.exceptions.HTTPError(response=self)
+
+    def fake_get(url, **kwargs):  # noqa: ARG001
+        if url.startswith("https://internal.example/"):
+            if internal_error is None:
+                raise requests.exceptions.ConnectionError
+            return ErrorResponse(status_code=internal_error)
+        data = {"files": [{"filename": "acme_lib-9.0.tar.gz"}]}
+        return FakeResponse(content=json.dumps(data).encode(), headers={"Content-Type": bd.SIMPLE_JSON_CONTENT_TYPE})
+
+    internal = bd.SimpleIndex("https://internal.example/simple")
+    pypi = bd.SimpleIndex("https://pypi.example/simple")
+    updater = bd.Updater(index=bd.MultiIndex([internal, pypi]), hedge=False)
+    monkeypatch.setattr(updater.session, "get", fake_get)
+    # an unreachable internal index mustn't let a public package of the same name be used
+    assert updater.fetch_new_package_version("acme-lib", ">=3.10") == expected
+
+
+def test_negative_cache_entries_expire(tmp_path):
+    cache = bd.NegativeCache(tmp_path, ttl=60)
+    cache.add("https://pypi.example/simple", "Foo_Bar")
+    assert cache.contains("https://pypi.example/simple", "foo-bar")
+    assert not cache.contains("https://internal.example/simple", "foo-bar")
+    for name in os.listdir(cache.cache_dir):
+        os.utime(os.path.join(cache.cache_dir, name), (time.time() - 120, time.time() - 120))
+    assert not cache.contains("https://pypi.example/simple", "foo-bar")
+    assert bd.NegativeCache(tmp_path).ttl == bd.DEFAULT_NEGATIVE_CACHE_TTL
+
+
+def test_multi_index_only_caches_404_of_project_page(monkeypatch, tmp_path):
+    class NotFoundResponse(FakeResponse):
+        def raise_for_status(self):
+            raise requests.exceptions.HTTPError(response=self)
+
+    def fake_get(url, **kwargs):  # noqa: ARG001
+        if url == "https://pypi.example/simple/foo/":
+            return FakeResponse(content=b"foo-1.0.tar.gz", headers={"Content-Type": "text/plain"})
+        return NotFoundResponse(status_code=404)
+
+    pypi = bd.SimpleIndex("https://pypi.example/simple")
+    internal = bd.SimpleIndex("https://internal.example/simple")
+    index = bd.MultiIndex([internal, pypi], negative_cache=bd.NegativeCache(tmp_path))
+    updater = bd.Updater(index=index, hedge=False)
+    monkeypatch.setattr(updater.session, "get", fake_get)
+    assert updater.fetch_new_package_version("foo", ">=3.10") is None
+    # the JSON API fallback's 404 doesn't mean the project page is missing
+    assert not index.negative_cache.contains("https://pypi.example/simple", "foo")
+    assert index.negative_cache.contains("https://internal.example/simple", "foo")
+
+
+def test_releases_from_simple_json(monkeypatch):
+    data = {
+        "files": [
+            {"filename": "foo-1.0.tar.gz", "requires-python": ">=3.8", "yanked": False},
+            {"filename": "foo-1.0-py3-none-any.whl", "requires-python": ">=3.8", "yanked": False},
+            {"filename": "foo-2.0rc1-py3-none-any.whl", "requires-python": None, "yanked": "broken"},
+            {"filename": "foo-0.1-py2.7.egg"},
+        ]
+    }
+
+    def fake_fetch(url, accept=None, revalidate=False):  # noqa: ARG001
+        assert accept == bd.SIMPLE_ACCEPT
+        return bd.SIMPLE_JSON_CONTENT_TYPE, json.dumps(data).encode()
+
+    updater = bd.Updater()
+    monkeypatch.setattr(updater, "fetch", fake_fetch)
+    releases = updater.fetch_releases("foo")
+    assert releases == {
+        "1.0": [{"requires_python": ">=3.8", "yanked": False}],
+        "2.0rc1": [{"requires_python": None, "yanked": True}],
+    }
+
+
+def test_releases_from_simple_html():
+    html = """<!DOCTYPE html>
+    <html><body>
+    <a href="../../packages/foo-1.0.tar.gz#sha256=00" data-requires-python="&gt;=3.8">foo-1.0.tar.gz</a><br/>
+    <a href="../../packages/foo-2.0-py3-none-any.whl" data-yanked="">foo-2.0-py3-none-any.whl</a><br/>
+    </body></html>
+    """
+    assert bd.releases_from_simple_html(html) == {
+        "1.0": [{"requires_python": ">=3.8", "yanked": False}],
+        "2.0": [{"requires_python": None, "yanked": True}],
+    }
+
+
+def test_fetch_releases_falls_back_to_json_api(monkeypatch):
+    def fake_fetch(url, accept=None, revalidate=False):  # noqa: ARG001
+        if accept == bd.SIMPLE_ACCEPT:
+            assert url == "https://mirror.example/simple/foo/"
+            return "text/plain", b"foo-1.0.tar.gz"
+        assert url == "https://mirror.example/pypi/foo/json"
+        return "application/json", b'{"releases": {"1.0": [{"requires_python": null}]}}'
+
+    updater = bd.Updater(index=bd.SimpleIndex("https://mirror.example/simple/"))
+    monkeypatch.setattr(updater, "fetch", fake_fetch)
+    assert updater.fetch_releases("foo") == {"1.0": [{"requires_python": None, "yanked": False}]}
+
+
+def test_decode_releases_from_json_api():
+    document = {
+        "info": {"name": "foo", "description": "x" * 1000},
+        "releases": {
+            "1.0": [
+                {"filename": "foo-1.0.tar.gz", "requires_python": ">=3.8", "digests": {"sha256": "00"}, "url": "u"},
+                {"filename": "foo-1.0-py3-none-any.whl", "requires_python": ">=3.8", "yanked": False},
+                {"filename": "foo-1.0-py2-none-any.whl", "requires_python": None, "yanked": True},
+            ],
+            "2.0": [],
+        },
+        "urls": [{"filename": "foo-1.0.tar.gz", "requires_python": ">=3.8"}],
+    }
+    releases = bd.decode_releases(json.dumps(document).encode())
+    assert releases == {
+        "1.0": [{"requires_python": ">=3.8", "yanked": False}, {"requires_python": None, "yanked": True}],
+    }
+
+
+def test_select_newest_version_from_unsorted_releases():
+    files = [{"requires_python": None, "yanked": False}]
+    releases = {"1.10": files, "invalid version": files, "1.9": files, "2.0b1": files, "1.2": files}
+    releases["1.11"] = [{"requires_python": ">=3.12", "yanked": False}]
+    updater = bd.Updater()
+    assert updater.select_new_package_version("foo", releases, ">=3.10,<3.12") == "1.10"
+
+
+@pytest.mark.parametrize("mmap_size", [0, bd.RELEASE_INDEX_MMAP_SIZE])
+def test_release_index_round_trip(monkeypatch, tmp_path, mmap_size):
+    monkeypatch.setattr(bd, "RELEASE_INDEX_MMAP_SIZE", mmap_size)
+    releases = {
+        "1.0": [{"requires_python": ">=3.8", "yanked": False}, {"requires_python": None, "yanked": True}],
+        "10.0": [{"requires_python": ">=3.10", "yanked": False}],
+        "2.0rc1": [{"requires_python": ">=3.8", "yanked": False}],
+        "not-a-version": [{"requires_python": None, "yanked": False}],
+        "2.0": [],
+    }
+    path = tmp_path / "foo.releases"
+    path.write_bytes(bd.ReleaseIndex.encode(releases, b"x" * 32))
+    index = bd.ReleaseIndex.load(path)
+    assert index.digest == b"x" * 32
+    assert list(index) == ["10.0", "2.0", "2.0rc1", "1.0", "not-a-version"]
+    assert index == releases
+    assert [ver_str for ver_str, _ in index.iter_stable_newest_first()] == ["10.0", "2.0", "1.0"]
+    assert bd.Updater().select_new_package_versions("foo", index, ["<3.10", ">=3.12"]) == ["1.0", "10.0"]
+    with pytest.raises(ValueError, match="not a release index"):
+        bd.ReleaseIndex(b"\0" * 64)
+
+
+def test_http_cache_stores_release_index(monkeypatch, tmp_path):
+    data = {"files": [{"filename": "foo-1.0.tar.gz", "requires-python": ">=3.8"}]}
+    decoded = []
+    decode_releases = bd.decode_releases
+
+    def fake_decode_releases(content):
+        decoded.append(content)
+        return decode_releases(content)
+
+    updater = bd.Updater(http_cache=bd.HTTPCache(tmp_path))
+    monkeypatch.setattr(bd, "decode_releases", fake_decode_releases)
+    monkeypatch.setattr(
+        updater, "fetch", lambda *_args, **_kwargs: (bd.SIMPLE_JSON_CONTENT_TYPE, json.dumps(data).encode())
+    )
+    expected = {"1.0": [{"requires_python": ">=3.8", "yanked": False}]}
+    assert updater.fetch_releases("foo") == expected
+    releases = updater.fetch_releases("foo")
+    assert isinstance(releases, bd.ReleaseIndex)
+    assert releases == expected
+    assert len(decoded) == 1
+    data["files"].append({"filename": "foo-2.0.tar.gz"})
+    assert "2.0" in updater.fetch_releases("foo")
+    assert len(decoded) == 2
+
+
+def test_fresh_cache_hit_loads_release_index_without_reading_body(monkeypatch, tmp_path):
+    content = json.dumps({"files": [{"filename": "foo-1.0.tar.gz", "requires-python": ">=3.8"}]}).encode()
+
+    def fake_get(_url, **_kwargs):
+        return FakeResponse(content=content, headers={"Content-Type": bd.SIMPLE_JSON_CONTENT_TYPE})
+
+    updater = bd.Updater(http_cache=bd.HTTPCache(tmp_path), hedge=False)
+    monkeypatch.setattr(updater.session, "get", fake_get)
+    expected = {"1.0": [{"requires_python": ">=3.8", "yanked": False}]}
+    assert updater.fetch_releases("foo") == expected
+    monkeypatch.setattr(updater.http_cache, "get", pytest.fail)
+    monkeypatch.setattr(updater.session, "get", pytest.fail)
+    releases = updater.fetch_releases("foo")
+    assert isinstance(releases, bd.ReleaseIndex)
+    assert releases == expected
+
+
+def test_fetch_skips_yanked_releases(monkeypatch):
+    releases = {
+        "2.0": [{"requires_python": None, "yanked": True}],
+        "1.0": [{"requires_python": None, "yanked": False}],
+    }
+    updater = bd.Updater()
+    updater.requires_python_spec = ">=3.13"
+    monkeypatch.setattr(updater, "fetch_releases", lambda _package_name: releases)
+    assert updater.fetch_new_package_version("foo") == "1.0"
+
+
+def test_fetch_releases_rejects_unexpected_content_type(monkeypatch):
+    def fake_get(_url, **_kwargs):
+        return FakeResponse(content=b"foo-1.0.tar.gz", headers={"Content-Type": "text/plain"})
+
+    updater = bd.Updater(index=bd.SimpleIndex("https://devpi.example/root/pypi/+simple"))
+    monkeypatch.setattr(updater.session, "get", fake_get)
+    assert updater.fetch_releases("foo") is None
+
+
+@pytest.mark.parametrize(
+    ("requires_python_a", "requires_python_b", "expected"),
+    [
+        (">=3.9", ">=3.8", True),
+        (">=3.9", "<3.0", False),
+        (">=3.9", "<=3.9", True),
+        (">3.9", "<=3.9", False),
+        ("==3.0", ">=3.9", False),
+        ("==3.9.*", "!=3.9.*", False),
+        (">=3.9,<3.10", "!=3.9.*", False),
+        (">=3.9,<3.11", "!=3.9.*", True),
+        ("==3.12", ">=3.8,!=3.12", False),
+        ("~=3.9", "<3.9", False),
+        ("~=3.9.1", ">=3.10", False),
+        ("~=3.9", ">=3.13", True),
+        ("==3.9.7", "==3.9.*", True),
+        ("", ">=3.9", True),
+    ],
+)
+def test_requires_python_intersects(requires_python_a, requires_python_b, expected):
+    assert bd.requires_python_intersects(requires_python_a, requires_python_b) is expected
+    assert bd.requires_python_intersects(requires_python_b, requires_python_a) is expected
+
+
+def test_compile_requires_python_with_invalid_specifier():
+    with pytest.raises(ValueError, match=r"Invalid specifier"):
+        bd.compile_requires_python(">=3.9,foo")
+
+
+def test_run_many_resolves_shared_packages_once(monkeypatch, tmp_path):
+    fetched = []
+
+    def fake_fetch_releases(_updater, package_name):
+        fetched.append(package_name)
+        return {"3.0": [{"requires_python": ">=3.10"}], "2.0": [{"requires_python": None}]}
+
+    monkeypatch.setattr(bd.Updater, "fetch_releases", fake_fetch_releases)
+    paths = []
+    for name, requires_python in (("a", ">=3.10"), ("b", ">=3.8,<3.10"), ("c", ">=3.10")):
+        path = tmp_path / name / "pyproject.toml"
+        path.parent.mkdir()
+        path.write_text(
+            f'[project]\nname = "{name}"\nversion = "1.0"\nrequires-python = "{requires_python}"\n'
+            'dependencies = ["foo==1.0", "bar>=1.0"]\n'
+        )
+        paths.append(str(path))
+    (tmp_path / ".hidden").mkdir()
+    (tmp_path / ".hidden" / "pyproject.toml").write_text("")
+    assert bd.discover_pyproject_toml_paths(str(tmp_path)) == paths
+    summary = bd.run_many(paths, dry_run=False, jobs=4)
+    assert summary == dict.fromkeys(paths, "2 updated")
+    assert sorted(fetched) == ["bar", "foo"]
+    assert tomlkit.loads((tmp_path / "a" / "pyproject.toml").read_text())["project"]["dependencies"] == [
+        "foo==3.0",
+        "bar>=3.0",
+    ]
+    assert tomlkit.loads((tmp_path / "b" / "pyproject.toml").read_text())["project"]["dependencies"] == [
+        "foo==2.0",
+        "bar>=2.0",
+    ]
+
+
+def test_run_many_skips_files_with_invalid_requires_python(monkeypatch, tmp_path):
+    monkeypatch.setattr(bd.Updater, "fetch_releases", lambda _updater, _package_name: {"2.0": [{}]})
+    paths = []
+    for name, requires_python in (("a", ">=3.10"), ("b", "python3")):
+        path = tmp_path / name / "pyproject.toml"
+        path.parent.mkdir()
+        path.write_text(
+            f'[project]\nname = "{name}"\nversion = "1.0"\nrequires-python = "{requires_python}"\n'
+            'dependencies = ["foo==1.0"]\n'
+        )
+        paths.append(str(path))
+    summary = bd.run_many(paths, dry_run=True, validate=False)
+    assert summary[paths[0]] == "1 updates available (dry-run)"
+    assert summary[paths[1]].startswith("skipped (invalid requires-python specifier 'python3': ")
+
+
+def test_import_is_lazy():
+    modules = "{'requests', 'tomlkit', 'validate_pyproject'}"
+    code = f"import sys, bump_dependencies; print(sorted({modules} & sys.modules.keys()))"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)  # noqa: S603
+    assert result.stdout.strip() == "[]"
+
+
+def test_validation_cache(monkeypatch, tmp_path):
+    path = tmp_path / "pyproject.toml"
+    path.write_text(pyproject_toml_data.replace('name = "foo"', 'name = "foo"\nversion = "1.0"'))
+    validation_cache = bd.ValidationCache(tmp_path)
+    bd.Updater(str(path), validation_cache=validation_cache)
+    assert len(os.listdir(validation_cache.cache_dir)) == 1
+    monkeypatch.setattr("validate_pyproject.api.Validator", None)
+    updater = bd.Updater(str(path), validation_cache=validation_cache)
+    assert updater.pyproject_data["project"]["version"] == "1.0"
+
+
+def test_invalid_pyproject_is_not_cached(tmp_path):
+    path = tmp_path / "pyproject.toml"
+    path.write_text('[project]\nname = "foo"\nversion = 1\n')
+    validation_cache = bd.ValidationCache(tmp_path)
+    with pytest.raises(bd.PyprojectError, match=r"invalid pyproject.toml"):
+        bd.Updater(str(path), validation_cache=validation_cache)
+    assert os.listdir(validation_cache.cache_dir) == []
+    bd.Updater(str(path), validate=False)
+
+
+@pytest.mark.parametrize("archive_format", ["zip", "gztar"])
+def test_offline_index_archive(offline_index, tmp_path, archive_format):
+    archive = shutil.make_archive(str(tmp_path / "snapshot"), archive_format, offline_index.path)
+    updater = bd.Updater(index=bd.SnapshotIndex(archive))
+    updater.requires_python_spec = ">=3.9,<3.10"
+    assert updater.fetch_new_package_version("Bump_Dependencies") == "0.1.0"
+    assert updater.fetch_new_package_version("foo") is None
+
+
+def test_stats_records_phases_and_packages(offline_index, tmp_path):
+    path = tmp_path / "pyproject.toml"
+    path.write_text(
+        '[project]\nname = "foo"\nversion = "1.0"\nrequires-python = ">=3.10"\n'
+        'dependencies = ["bump-dependencies>=0.1.0"]\n'
+    )
+    events = []
+    stats = bd.Stats()
+    stats.subscribe(lambda event, data: events.append((event, data["name"])))
+    updater = bd.Updater(str(path), validate=False, index=offline_index, stats=stats)
+    updater.update(dry_run=True)
+    data = stats.to_dict()
+    assert set(data["phases"]) == {"load", "resolve"}
+    record = data["packages"]["bump-dependencies"]
+    assert record["cache"] == "offline"
+    assert record["bytes_received"] > 0
+    assert ("package", "bump-dependencies") in events
+    assert "bump-dependencies" in stats.format_summary()
+
+
+def test_stats_records_http_errors(monkeypatch):
+    def fake_get(_url, **_kwargs):
+        response = requests.Response()
+        response.status_code = 404
+        raise requests.exceptions.HTTPError(response=response)
+
+    updater = bd.Updater()
+    monkeypatch.setattr(updater.session, "get", fake_get)
+    assert updater.fetch_new_package_version("foo") is None
+    record = updater.stats.packages["foo"]
+    assert record["status"] == 404
+    assert record["requests"] == 1
+
+
+@pytest.mark.parametrize("http_cache", [False, True])
+def test_state_file_only_fetches_changed_packages(monkeypatch, tmp_path, http_cache):
+    changelog = []
+    fetched = []
+
+    def fake_post(_url, data, **_kwargs):
+        params, method = xmlrpc.client.loads(data)
+        if method == "changelog_last_serial":
+            result = changelog[-1][-1] if changelog else 1
+        else:
+            result = [event for event in changelog if event[-1] > params[0]]
+        return FakeResponse(content=xmlrpc.client.dumps((result,), methodresponse=True).encode())
+
+    def fake_get(url, **_kwargs):
+        package_name = url.rstrip("/").rsplit("/", 1)[-1]
+        fetched.append(package_name)
+        version = "2.0" if changelog else "1.0"
+        page = {"files": [{"filename": f"{package_name}-{version}.tar.gz", "requires-python": None}]}
+        return FakeResponse(
+            content=json.dumps(page).encode(),
+            headers={"Content-Type": bd.SIMPLE_JSON_CONTENT_TYPE},
+        )
+
+    state_path = tmp_path / "state.json"
+
+    def resolve():
+        # a fresh cached page of a changed package predates the new serial, so it mustn't be used as is
+        cache = bd.HTTPCache(tmp_path / "cache") if http_cache else None
+        updater = bd.Updater(state=bd.StateFile(str(state_path)), http_cache=cache)
+        monkeypatch.setattr(updater.session, "get", fake_get)
+        monkeypatch.setattr(updater.session, "post", fake_post)
+        updater.requires_python_spec = ">=3.10"
+        updater.resolve_package_versions(["foo", "bar"])
+        return [updater.resolve_package_version(package_name) for package_name in ("foo", "bar")]
+
+    assert resolve() == ["1.0", "1.0"]
+    assert json.loads(state_path.read_text())["serial"] == 1
+    changelog.append(["Foo", "2.0", 0, "new release", 2])
+    fetched.clear()
+    assert resolve() == ["2.0", "1.0"]
+    assert fetched == ["foo"]
+    assert json.loads(state_path.read_text())["serial"] == 2
+
+
+def test_changed_since_reads_changelog_page_by_page(monkeypatch):
+    changelog = [["Foo", "1.0", 0, "new release", 2], ["bar", "1.0", 0, "new release", 3], ["baz", "1.0", 0, "", 5]]
+    calls = []
+
+    def fake_call_xmlrpc(_url, method, serial):
+        calls.append((method, serial))
+        return [event for event in changelog if event[-1] > serial][:2]
+
+    index = bd.SimpleIndex()
+    updater = bd.Updater(index=index)
+    monkeypatch.setattr(updater, "call_xmlrpc", fake_call_xmlrpc)
+    assert index.changed_since(updater, 1, 5) == {"foo", "bar", "baz"}
+    assert calls == [("changelog_since_serial", 1), ("changelog_since_serial", 3)]
+    assert index.changed_since(updater, 5, 5) == set()
+    # the changelog doesn't reach the current serial, so some changes are unknown
+    assert index.changed_since(updater, 1, 6) is None
+
+
+def test_state_file_without_changelog_fetches_everything(offline_index, tmp_path):
+    state = bd.StateFile(str(tmp_path / "state.json"))
+    state.serial = 1
+    state.packages = {"bump-dependencies": {">=3.10": "0.0.1"}}
+    updater = bd.Updater(index=offline_index, state=state)
+    updater.requires_python_spec = ">=3.10"
+    updater.resolve_package_versions(["bump-dependencies"])
+    assert updater.resolve_package_version("bump-dependencies") == "0.1.8"
+    assert state.serial is None
+
+
+def test_update_records_edits_and_writes_atomically(monkeypatch, tmp_path):
+    path = tmp_path / "pyproject.toml"
+    path.write_text(pyproject_toml_data + "\n[tool.foo]\nbar = 1  # keep me\n")
+    path.chmod(0o640)
+    updater = bd.Updater(str(path), validate=False)
+    new_versions = {"numpy": "2.0", "pytest-timeout": "2.3"}
+    monkeypatch.setattr(updater, "resolve_package_versions", lambda _package_names: None)
+    monkeypatch.setattr(updater, "resolve_package_version", new_versions.get)
+    updater.update(dry_run=False)
+    assert [edit._asdict() for edit in updater.edits] == [
+        {"group": ("project", "dependencies"), "index": 1, "old": "numpy>=1.26.4", "new": "numpy>=2.0"},
+        {"group": ("dependency-groups", "test"), "index": 1, "old": "pytest-timeout>2.2", "new": "pytest-timeout>2.3"},
+    ]
+    content = path.read_text()
+    assert '"numpy>=2.0",' in content
+    assert "bar = 1  # keep me" in content
+    assert path.stat().st_mode & 0o777 == 0o640
+    assert os.listdir(tmp_path) == ["pyproject.toml"]
+
+
+def test_update_without_edits_does_not_write(monkeypatch, tmp_path):
+    path = tmp_path / "pyproject.toml"
+    path.write_text(pyproject_toml_data)
+    updater = bd.Updater(str(path), validate=False)
+    monkeypatch.setattr(updater, "resolve_package_versions", lambda _package_names: None)
+    monkeypatch.setattr(updater, "resolve_package_version", lambda _package_name: None)
+    mtime = path.stat().st_mtime_ns
+    updater.update(dry_run=False)
+    assert updater.edits == []
+    assert path.stat().st_mtime_ns == mtime
+
+
+def test_metadata_urls_from_simple_page():
+    page_url = "https://pypi.org/simple/foo/"
+    data = {
+        "files": [
+            {"filename": "foo-1.0.tar.gz", "url": "../../packages/foo-1.0.tar.gz#sha256=00", "core-metadata": True},
+            {"filename": "foo-1.0-py3-none-any.whl", "url": "https://files.example/foo-1.0-py3-none-any.whl"},
+            {"filename": "foo-2.0-py3-none-any.whl", "url": "foo-2.0-py3-none-any.whl", "dist-info-metadata": True},
+        ]
+    }
+    html = """<a href="../../packages/foo-1.0.tar.gz" data-core-metadata="sha256=00">foo-1.0.tar.gz</a>
+    <a href="../../packages/foo-1.0-py3-none-any.whl" data-core-metadata="true">foo-1.0-py3-none-any.whl</a>
+    <a href="../../packages/foo-2.0-py3-none-any.whl" data-core-metadata="false">foo-2.0-py3-none-any.whl</a>
+    """
+    content = json.dumps(data).encode()
+    assert bd.metadata_urls_from_simple_page(bd.SIMPLE_JSON_CONTENT_TYPE, content, page_url, "1.0") == [
+        "https://pypi.org/packages/foo-1.0.tar.gz.metadata"
+    ]
+    assert bd.metadata_urls_from_simple_page(bd.SIMPLE_JSON_CONTENT_TYPE, content, page_url, "2.0") == [
+        "https://pypi.org/simple/foo/foo-2.0-py3-none-any.whl.metadata"
+    ]
+    assert bd.metadata_urls_from_simple_page("text/html", html.encode(), page_url, "1.0") == [
+        "https://pypi.org/packages/foo-1.0-py3-none-any.whl.metadata",
+        "https://pypi.org/packages/foo-1.0.tar.gz.metadata",
+    ]
+    assert bd.metadata_urls_from_simple_page("text/html", html.encode(), page_url, "2.0") == []
+
+
+@pytest.fixture
+def conflicting_index(monkeypatch, tmp_path):
+    """Serve foo, bar and qux, where foo 2.0 requires an older bar and a newer qux than the ones pinned."""
+    requires_dist = {
+        "foo": {"1.0": [], "1.5": ["bar<2", "qux>=1"], "2.0": ["bar<2", "qux>=2", "bar<1; python_version < '3'"]},
+        "bar": {"1.0": [], "1.5": [], "2.0": []},
+        "qux": {"1.0": []},
+    }
+    fetched = []
+
+    def fake_fetch(url, accept=None, revalidate=False):  # noqa: ARG001
+        fetched.append(url)
+        if url.endswith(".metadata"):
+            name, version = url.rsplit("/", 1)[1].split("-")[:2]
+            lines = ["Metadata-Version: 2.1", f"Name: {name}", f"Version: {version}"]
+            lines.extend(f"Requires-Dist: {requirement}" for requirement in requires_dist[name][version])
+            return "application/octet-stream", "\n".join(lines).encode()
+        name = url.rstrip("/").rsplit("/", 1)[1]
+        filenames = [f"{name}-{version}-py3-none-any.whl" for version in requires_dist[name]]
+        files = [
+            {"filename": filename, "url": f"{filename}#sha256=00", "core-metadata": True} for filename in filenames
+        ]
+        return bd.SIMPLE_JSON_CONTENT_TYPE, json.dumps({"files": files}).encode()
+
+    path = tmp_path / "pyproject.toml"
+    path.write_text(
+        '[project]\nname = "x"\nversion = "1.0"\nrequires-python = ">=3.10"\n'
+        'dependencies = ["foo==1.0", "bar>=1.0", "qux==1.0"]\n'
+    )
+
+    def make_updater(check_conflicts):
+        updater = bd.Updater(str(path), validate=False, check_conflicts=check_conflicts)
+        monkeypatch.setattr(updater, "fetch", fake_fetch)
+        return updater
+
+    make_updater.fetched = fetched
+    return make_updater
+
+
+def test_check_conflicts_reports_conflicting_pins(conflicting_index, caplog):
+    updater = conflicting_index("report")
+    with caplog.at_level("INFO", logger="updater"):
+        updater.update(dry_run=True)
+    assert [edit.new for edit in updater.edits] == ["foo==2.0", "bar>=2.0"]
+    assert "- conflict: 'foo==2.0' requires 'bar<2', which excludes 'bar>=2.0'" in caplog.text
+    assert "- conflict: 'foo==2.0' requires 'qux>=2', which excludes 'qux==1.0'" in caplog.text
+    assert "python_version" not in caplog.text
+    metadata_urls = [url for url in conflicting_index.fetched if url.endswith(".metadata")]
+    assert sorted(metadata_urls) == [
+        "https://pypi.org/simple/bar/bar-2.0-py3-none-any.whl.metadata",
+        "https://pypi.org/simple/foo/foo-2.0-py3-none-any.whl.metadata",
+    ]
+    assert not any(url.endswith((".whl", ".tar.gz")) for url in conflicting_index.fetched)
+
+
+def test_check_conflicts_falls_back_to_newest_release_without_conflicts(conflicting_index, caplog):
+    updater = conflicting_index("fallback")
+    with caplog.at_level("INFO", logger="updater"):
+        updater.update(dry_run=True)
+    assert [edit.new for edit in updater.edits] == ["foo==1.5", "bar>=1.5"]
+    assert "- falling back: 'bar>=1.0' to 'bar>=1.5'" in caplog.text
+    assert "- falling back: 'foo==1.0' to 'foo==1.5'" in caplog.text
+    assert "- conflict:" not in caplog.text
+
+
+def test_serve_shares_resolved_versions_between_clients(monkeypatch, offline_index, tmp_path):
+    fetched = []
+    fetch_releases = offline_index.fetch_releases
+
+    def counting_fetch_releases(updater, package_name):
+        fetched.append(package_name)
+        return fetch_releases(updater, package_name)
+
+    monkeypatch.setattr(offline_index, "fetch_releases", counting_fetch_releases)
+    server = bd.make_server(port=0, index=offline_index)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        server_url = f"http://127.0.0.1:{server.server_address[1]}"
+        for name in ("a", "b"):
+            path = tmp_path / f"{name}.toml"
+            path.write_text(
+                f'[project]\nname = "{name}"\nversion = "1.0"\nrequires-python = ">=3.10"\n'
+                'dependencies = [\n    "bump-dependencies >= 0.1.0",  # keep me\n]\n'
+            )
+            edits = bd.run_remote(server_url, str(path), dry_run=False, validate=False)
+            assert edits == [
+                {
+                    "group": ["project", "dependencies"],
+                    "index": 0,
+                    "old": "bump-dependencies >= 0.1.0",
+                    "new": "bump-dependencies >= 0.1.8",
+                }
+            ]
+            assert '"bump-dependencies >= 0.1.8",  # keep me' in path.read_text()
+        assert fetched == ["bump-dependencies"]
+        path.write_text("[project\n")
+        with pytest.raises(SystemExit, match=r"invalid pyproject\.toml"):
+            bd.run_remote(server_url, str(path), dry_run=True)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_serve_answers_bad_requests_with_errors(monkeypatch, offline_index):
+    def fail(_self):
+        raise RuntimeError("boom")
+
+    server = bd.make_server(port=0, index=offline_index)
+    url = f"http://127.0.0.1:{server.server_address[1]}/update"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        for body, error in [
+            (b"[1]", "expected a JSON object"),
+            (b'{"path": "pyproject.toml"}', "'pyproject' must be a string"),
+            (b'{"pyproject": "", "validate": "no"}', "'validate' must be a boolean"),
+        ]:
+            response = requests.post(url, data=body, timeout=10)
+            assert response.status_code == 400
+            assert response.json() == {"error": f"invalid request: {error}"}
+        request = {"pyproject": 'project = "x"', "validate": False}
+        response = requests.post(url, json=request, timeout=10)
+        assert response.status_code == 400
+        assert response.json()["error"] == "'project' in pyproject.toml is not a table"
+        monkeypatch.setattr(bd.Updater, "get_edits", fail)
+        request = {"pyproject": '[project]\ndependencies = ["foo==1.0"]\n', "validate": False}
+        response = requests.post(url, json=request, timeout=10)
+        assert response.status_code == 500
+        assert response.json()["error"] == "internal error: boom"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_resolve_matrix_fetches_each_package_once(monkeypatch):
+    fetched = []
+
+    def fake_fetch_releases(package_name):
+        fetched.append(package_name)
+        return {
+            "3.0": [{"requires_python": ">=3.12", "yanked": False}],
+            "2.1": [{"requires_python": ">=3.10", "yanked": True}],
+            "2.0": [{"requires_python": ">=3.10", "yanked": False}],
+            "1.0": [{"requires_python": None, "yanked": False}],
+        }
+
+    updater = bd.Updater()
+    monkeypatch.setattr(updater, "fetch_releases", fake_fetch_releases)
+    table = updater.resolve_matrix(["Foo", "foo"], ["3.9", "3.10", "3.11", "3.12"])
+    assert table == {"foo": {"3.9": "1.0", "3.10": "2.0", "3.11": "2.0", "3.12": "3.0"}}
+    assert fetched == ["foo"]
+
+
+@pytest.mark.parametrize(
+    ("options", "message"),
+    [
+        (["--python-matrix", "3.11,3.12", "--format", "jsonl"], "--python-matrix can't be used with --format jsonl"),
+        (["--format", "jsonl", "--check-conflicts"], "--check-conflicts can't be used with"),
+        (["--split-markers"], "--split-markers requires --python-matrix"),
+        (["--server", "http://127.0.0.1:1", "--python-matrix", "3.12"], "--python-matrix can't be used with --server"),
+        (["--server", "http://127.0.0.1:1", "--deadline", "5"], "--deadline can't be used with --server"),
+        (["--server", "http://127.0.0.1:1", "--no-hedge"], "--no-hedge can't be used with --server"),
+        (["--server", "http://127.0.0.1:1", "--format", "jsonl"], "--format can't be used with --server"),
+    ],
+)
+def test_main_rejects_incompatible_options(monkeypatch, capsys, tmp_path, options, message):
+    path = tmp_path / "pyproject.toml"
+    path.write_text('[project]\nname = "x"\nversion = "1.0"\ndependencies = ["foo==1.0"]\n')
+    monkeypatch.setattr(sys, "argv", ["bump_dependencies", "--path", str(path), *options])
+    with pytest.raises(SystemExit) as exc_info:
+        bd.main()
+    assert exc_info.value.code == 2
+    assert message in capsys.readouterr().err
+    assert path.read_text() == '[project]\nname = "x"\nversion = "1.0"\ndependencies = ["foo==1.0"]\n'
+
+
+def test_run_matrix_merges_rows_of_the_same_package(caplog, offline_index, tmp_path):
+    path = tmp_path / "pyproject.toml"
+    path.write_text(
+        '[project]\nname = "x"\nversion = "1.0"\nrequires-python = ">=3.9"\n'
+        'dependencies = ["bump-dependencies==0.1.0"]\n'
+        'optional-dependencies = {extra = ["Bump_Dependencies[x]>=0.1.0"]}\n'
+    )
+    with caplog.at_level("INFO", logger="updater"):
+        table = bd.run_matrix(str(path), ["3.9", "3.12"], split_markers=True, index=offline_index, validate=False)
+    assert table == {"bump-dependencies": {"3.9": "0.1.0", "3.12": "0.1.8"}}
+    assert sum(line.startswith("bump-dependencies ") for line in caplog.messages) == 1
+    assert '- Bump_Dependencies[x]>=0.1.8; python_version >= "3.12"' in caplog.messages
+
+
+@pytest.mark.parametrize(
+    ("dependency_specifier", "new_versions", "expected"),
+    [
+        ("foo>=1.0", {"3.10": "2.0", "3.11": "2.0"}, ["foo>=2.0"]),
+        (
+            "foo >= 1.0",
+            {"3.9": "1.5", "3.10": "2.0", "3.11": "2.0", "3.12": "3.0"},
+            [
+                'foo >= 1.5; python_version < "3.10"',
+                'foo >= 2.0; python_version >= "3.10" and python_version < "3.12"',
+                'foo >= 3.0; python_version >= "3.12"',
+            ],
+        ),
+        (
+            "foo==1.0; os_name == 'posix'",
+            {"3.8": None, "3.12": "3.0"},
+            ['foo==3.0; (os_name == "posix") and python_version >= "3.12"'],
+        ),
+    ],
+)
+def test_split_by_python_version(dependency_specifier, new_versions, expected):
+    assert bd.split_by_python_version(dependency_specifier, new_versions) == expected
+
+
+def test_iter_results_yields_every_specifier(monkeypatch):
+    def fake_fetch_releases(package_name):
+        return None if package_name == "numpy" else {"2.0": [{"requires_python": None}]}
+
+    updater = bd.Updater()
+    updater.pyproject_data = tomlkit.loads(pyproject_toml_data)
+    monkeypatch.setattr(updater, "fetch_releases", fake_fetch_releases)
+    results = {result["original"]: result for result in updater.iter_results()}
+    assert len(results) == 9
+    assert results["wheel"]["reason"] == "no version specified: 'wheel'"
+    assert results["wheel"]["latency"] is None
+    assert results["numpy>=1.26.4"]["updated"] is None
+    assert results["numpy>=1.26.4"]["reason"] == "error retrieving version from pypi.org"
+    assert results["pytest-timeout>2.2"] == {
+        "file": None,
+        "group": ["dependency-groups", "test"],
+        "index": 1,
+        "original": "pytest-timeout>2.2",
+        "updated": "pytest-timeout>2.0",
+        "reason": "new version available",
+        "latency": results["pytest-timeout>2.2"]["latency"],
+    }
+    assert results["pytest-timeout>2.2"]["latency"] >= 0
+    assert len(updater.edits) == 7
+    assert updater.pyproject_data["project"]["dependencies"][0] == "requests==2.32.1"
+
+
+def test_iter_results_many_files(offline_index, tmp_path):
+    good = tmp_path / "good.toml"
+    good.write_text(
+        '[project]\nname = "foo"\nversion = "1.0"\nrequires-python = ">=3.10"\n'
+        'dependencies = ["bump-dependencies>=0.1.0"]\n'
+    )
+    bad = tmp_path / "bad.toml"
+    bad.write_text('[project]\nname = "bar"\nversion = "1.0"\ndependencies = ["bump-dependencies>=0.1.0"]\n')
+    results = list(bd.iter_results([str(good), str(bad)], dry_run=False, index=offline_index, validate=False))
+    assert [(result["file"], result["updated"]) for result in results] == [
+        (str(good), "bump-dependencies>=0.1.8"),
+        (str(bad), None),
+    ]
+    assert "requires-python" in results[1]["reason"]
+    assert '"bump-dependencies>=0.1.8"' in good.read_text()